@@ -0,0 +1,309 @@
+""" Module to compute equinoxes, solstices and moon phases locally. """
+# pylint: disable=line-too-long
+import datetime
+import math
+from typing import List
+
+# Algorithms from Jean Meeus, "Astronomical Algorithms" (2nd ed.):
+# chapter 27 (equinoxes and solstices), chapter 38 (perihelion and aphelion)
+# and chapter 49 (phases of the Moon). Results are converted from Terrestrial
+# Time to Universal Time with the Espenak & Meeus polynomial fits for Delta T.
+# Accuracy is about a minute, which is plenty for whole-day holiday dates.
+
+J2000 = 2451545.0
+# Bump whenever a change moves any computed instant, so holiday tables and stored
+# holidays calculated by an earlier engine are not used
+ENGINE_VERSION = 1
+
+# Table 27.C: periodic terms (A, B, C) for the equinox and solstice correction.
+SEASON_TERMS = (
+    (485, 324.96, 1934.136), (203, 337.23, 32964.467), (199, 342.08, 20.186),
+    (182, 27.85, 445267.112), (156, 73.14, 45036.886), (136, 171.52, 22518.443),
+    (77, 222.54, 65928.934), (74, 296.72, 3034.906), (70, 243.58, 9037.513),
+    (58, 119.81, 33718.147), (52, 297.17, 150.678), (50, 21.02, 2281.226),
+    (45, 247.54, 29929.562), (44, 325.15, 31555.956), (29, 60.93, 4443.417),
+    (18, 155.12, 67555.328), (17, 288.79, 4562.452), (16, 198.04, 62894.029),
+    (14, 199.76, 31436.921), (12, 95.39, 14577.848), (12, 287.11, 31931.756),
+    (12, 320.81, 34777.259), (9, 227.73, 1222.114), (8, 15.45, 16859.074),
+)
+
+# Table 27.B: mean instants for years +1000 to +3000, Y = (year - 2000) / 1000.
+SEASON_MEAN = (
+    (2451623.80984, 365242.37404, 0.05169, -0.00411, -0.00057),  # March equinox
+    (2451716.56767, 365241.62603, 0.00325, 0.00888, -0.00030),   # June solstice
+    (2451810.21715, 365242.01767, -0.11575, 0.00337, 0.00078),   # September equinox
+    (2451900.05952, 365242.74049, -0.06223, -0.00823, 0.00032),  # December solstice
+)
+
+# Chapter 49 planetary arguments (constant, coefficient of k) and amplitudes.
+PLANETARY_ARGUMENTS = (
+    (251.88, 0.016321, 0.000165), (251.83, 26.651886, 0.000164),
+    (349.42, 36.412478, 0.000126), (84.66, 18.206239, 0.000110),
+    (141.74, 53.303771, 0.000062), (207.14, 2.453732, 0.000060),
+    (154.84, 7.306860, 0.000056), (34.52, 27.261239, 0.000047),
+    (207.19, 0.121824, 0.000042), (291.34, 1.844379, 0.000040),
+    (161.72, 24.198154, 0.000037), (239.56, 25.513099, 0.000035),
+    (331.55, 3.592518, 0.000023),
+)
+
+PHASE_NAMES = ("New Moon", "First Quarter", "Full Moon", "Last Quarter")
+
+def julian_day(date: datetime.datetime) -> float:
+    """ Convert a naive UT datetime to a Julian Day. """
+    year, month = date.year, date.month
+    if month <= 2:
+        year -= 1
+        month += 12
+    century = year // 100
+    gregorian = 2 - century + century // 4
+    day = date.day + (date.hour + (date.minute + date.second / 60) / 60) / 24
+    return (math.floor(365.25 * (year + 4716)) + math.floor(30.6001 * (month + 1))
+            + day + gregorian - 1524.5)
+
+def from_julian_day(jd: float) -> datetime.datetime:
+    """ Convert a Julian Day to a naive UT datetime. """
+    return datetime.datetime(2000, 1, 1, 12) + datetime.timedelta(days=jd - J2000)
+
+def delta_t(year: float) -> float:
+    """ Return TT - UT in seconds for the supported 1700-2150 range. """
+    # pylint: disable=too-many-return-statements
+    if year < 1800:
+        t = year - 1700
+        return 8.83 + 0.1603 * t - 0.0059285 * t**2 + 0.00013336 * t**3 - t**4 / 1174000
+    if year < 1860:
+        t = year - 1800
+        return (13.72 - 0.332447 * t + 0.0068612 * t**2 + 0.0041116 * t**3 - 0.00037436 * t**4
+                + 0.0000121272 * t**5 - 0.0000001699 * t**6 + 0.000000000875 * t**7)
+    if year < 1900:
+        t = year - 1860
+        return (7.62 + 0.5737 * t - 0.251754 * t**2 + 0.01680668 * t**3
+                - 0.0004473624 * t**4 + t**5 / 233174)
+    if year < 1920:
+        t = year - 1900
+        return -2.79 + 1.494119 * t - 0.0598939 * t**2 + 0.0061966 * t**3 - 0.000197 * t**4
+    if year < 1941:
+        t = year - 1920
+        return 21.20 + 0.84493 * t - 0.076100 * t**2 + 0.0020936 * t**3
+    if year < 1961:
+        t = year - 1950
+        return 29.07 + 0.407 * t - t**2 / 233 + t**3 / 2547
+    if year < 1986:
+        t = year - 1975
+        return 45.45 + 1.067 * t - t**2 / 260 - t**3 / 718
+    if year < 2005:
+        t = year - 2000
+        return (63.86 + 0.3345 * t - 0.060374 * t**2 + 0.0017275 * t**3
+                + 0.000651814 * t**4 + 0.00002373599 * t**5)
+    if year < 2050:
+        t = year - 2000
+        return 62.92 + 0.32217 * t + 0.005589 * t**2
+    return -20 + 32 * ((year - 1820) / 100)**2 - 0.5628 * (2150 - year)
+
+def tt_to_ut(jde: float) -> datetime.datetime:
+    """ Convert a Julian Ephemeris Day (TT) to a naive UT datetime. """
+    date = from_julian_day(jde)
+    year = date.year + (date.timetuple().tm_yday - 0.5) / 365.25
+    return date - datetime.timedelta(seconds=delta_t(year))
+
+def _sin(degrees: float) -> float:
+    """ Sine of an angle in degrees. """
+    return math.sin(math.radians(degrees))
+
+def _cos(degrees: float) -> float:
+    """ Cosine of an angle in degrees. """
+    return math.cos(math.radians(degrees))
+
+def season_instant(year: int, season: int) -> datetime.datetime:
+    """ UT instant of a season (0 March equinox, 1 June solstice, 2 September equinox, 3 December solstice). """
+    y = (year - 2000) / 1000
+    coefficients = SEASON_MEAN[season]
+    jde0 = sum(coefficient * y**power for power, coefficient in enumerate(coefficients))
+    t = (jde0 - J2000) / 36525
+    w = 35999.373 * t - 2.47
+    delta_lambda = 1 + 0.0334 * _cos(w) + 0.0007 * _cos(2 * w)
+    s = sum(a * _cos(b + c * t) for a, b, c in SEASON_TERMS)
+    return tt_to_ut(jde0 + 0.00001 * s / delta_lambda)
+
+def apsis_instant(year: int, aphelion: bool) -> datetime.datetime:
+    """ Approximate UT instant of the Earth's perihelion or aphelion in a given year. """
+    k = round(0.99997 * (year + 0.01 - 2000))
+    instant = _apsis_for(k, aphelion)
+    if instant.year < year:
+        instant = _apsis_for(k + 1, aphelion)
+    return instant
+
+def _apsis_for(k: float, aphelion: bool) -> datetime.datetime:
+    """ UT instant of the perihelion (or aphelion) with index k. """
+    if aphelion:
+        k += 0.5
+    jde = 2451547.507 + 365.2596358 * k + 0.0000000156 * k**2
+    a1 = 328.41 + 132.788585 * k
+    a2 = 316.13 + 584.903153 * k
+    a3 = 346.20 + 450.380738 * k
+    a4 = 136.95 + 659.306737 * k
+    a5 = 249.52 + 329.653368 * k
+    if aphelion:
+        jde += (-1.352 * _sin(a1) + 0.061 * _sin(a2) + 0.062 * _sin(a3)
+                + 0.029 * _sin(a4) + 0.031 * _sin(a5))
+    else:
+        jde += (1.278 * _sin(a1) - 0.055 * _sin(a2) - 0.091 * _sin(a3)
+                - 0.056 * _sin(a4) - 0.045 * _sin(a5))
+    return tt_to_ut(jde)
+
+def moon_phase_instant(k: float) -> datetime.datetime:
+    """ UT instant of the lunar phase with lunation number k (quarters at .25 steps). """
+    # pylint: disable=too-many-locals
+    t = k / 1236.85
+    jde = (2451550.09766 + 29.530588861 * k + 0.00015437 * t**2
+           - 0.000000150 * t**3 + 0.00000000073 * t**4)
+    e = 1 - 0.002516 * t - 0.0000074 * t**2
+    m = 2.5534 + 29.10535670 * k - 0.0000014 * t**2 - 0.00000011 * t**3
+    mp = (201.5643 + 385.81693528 * k + 0.0107582 * t**2
+          + 0.00001238 * t**3 - 0.000000058 * t**4)
+    f = (160.7108 + 390.67050284 * k - 0.0016118 * t**2
+         - 0.00000227 * t**3 + 0.000000011 * t**4)
+    omega = 124.7746 - 1.56375588 * k + 0.0020672 * t**2 + 0.00000215 * t**3
+    phase = round((k % 1) * 4) % 4
+
+    if phase in (0, 2):
+        if phase == 0:
+            leading = (-0.40720, 0.17241, 0.01608, 0.01039, 0.00739, -0.00514, 0.00208)
+        else:
+            leading = (-0.40614, 0.17302, 0.01614, 0.01043, 0.00734, -0.00515, 0.00209)
+        correction = (leading[0] * _sin(mp)
+                      + leading[1] * e * _sin(m)
+                      + leading[2] * _sin(2 * mp)
+                      + leading[3] * _sin(2 * f)
+                      + leading[4] * e * _sin(mp - m)
+                      + leading[5] * e * _sin(mp + m)
+                      + leading[6] * e**2 * _sin(2 * m)
+                      - 0.00111 * _sin(mp - 2 * f)
+                      - 0.00057 * _sin(mp + 2 * f)
+                      + 0.00056 * e * _sin(2 * mp + m)
+                      - 0.00042 * _sin(3 * mp)
+                      + 0.00042 * e * _sin(m + 2 * f)
+                      + 0.00038 * e * _sin(m - 2 * f)
+                      - 0.00024 * e * _sin(2 * mp - m)
+                      - 0.00017 * _sin(omega)
+                      - 0.00007 * _sin(mp + 2 * m)
+                      + 0.00004 * _sin(2 * mp - 2 * f)
+                      + 0.00004 * _sin(3 * m)
+                      + 0.00003 * _sin(mp + m - 2 * f)
+                      + 0.00003 * _sin(2 * mp + 2 * f)
+                      - 0.00003 * _sin(mp + m + 2 * f)
+                      + 0.00003 * _sin(mp - m + 2 * f)
+                      - 0.00002 * _sin(mp - m - 2 * f)
+                      - 0.00002 * _sin(3 * mp + m)
+                      + 0.00002 * _sin(4 * mp))
+    else:
+        correction = (-0.62801 * _sin(mp)
+                      + 0.17172 * e * _sin(m)
+                      - 0.01183 * e * _sin(mp + m)
+                      + 0.00862 * _sin(2 * mp)
+                      + 0.00804 * _sin(2 * f)
+                      + 0.00454 * e * _sin(mp - m)
+                      + 0.00204 * e**2 * _sin(2 * m)
+                      - 0.00180 * _sin(mp - 2 * f)
+                      - 0.00070 * _sin(mp + 2 * f)
+                      - 0.00040 * _sin(3 * mp)
+                      - 0.00034 * e * _sin(2 * mp - m)
+                      + 0.00032 * e * _sin(m + 2 * f)
+                      + 0.00032 * e * _sin(m - 2 * f)
+                      - 0.00028 * e**2 * _sin(mp + 2 * m)
+                      + 0.00027 * e * _sin(2 * mp + m)
+                      - 0.00017 * _sin(omega)
+                      - 0.00005 * _sin(mp - m - 2 * f)
+                      + 0.00004 * _sin(2 * mp + 2 * f)
+                      - 0.00004 * _sin(mp + m + 2 * f)
+                      + 0.00004 * _sin(mp - 2 * m)
+                      + 0.00003 * _sin(mp + m - 2 * f)
+                      + 0.00003 * _sin(3 * m)
+                      + 0.00002 * _sin(2 * mp - 2 * f)
+                      + 0.00002 * _sin(mp - m + 2 * f)
+                      - 0.00002 * _sin(3 * mp + m))
+        w = (0.00306 - 0.00038 * e * _cos(m) + 0.00026 * _cos(mp)
+             - 0.00002 * _cos(mp - m) + 0.00002 * _cos(mp + m) + 0.00002 * _cos(2 * f))
+        correction += w if phase == 1 else -w
+
+    correction += 0.000325 * _sin(299.77 + 0.107408 * k - 0.009173 * t**2)
+    correction += sum(amplitude * _sin(base + rate * k)
+                      for base, rate, amplitude in PLANETARY_ARGUMENTS)
+    return tt_to_ut(jde + correction)
+
+def _nth_weekday(year: int, month: int, weekday: int, nth: int) -> datetime.datetime:
+    """ Date of the nth weekday of a month (negative nth counts from the end). """
+    if nth > 0:
+        day = datetime.datetime(year, month, 1)
+        day += datetime.timedelta(days=(weekday - day.weekday()) % 7 + 7 * (nth - 1))
+    else:
+        next_month = datetime.datetime(year + month // 12, month % 12 + 1, 1)
+        day = next_month - datetime.timedelta(days=1)
+        day -= datetime.timedelta(days=(day.weekday() - weekday) % 7 + 7 * (-nth - 1))
+    return day
+
+def us_dst_in_effect(local_standard: datetime.datetime) -> bool:
+    """ Whether United States daylight saving time applies to a local standard time. """
+    year = local_standard.year
+    if year >= 2007:
+        start = _nth_weekday(year, 3, 6, 2)
+        end = _nth_weekday(year, 11, 6, 1)
+    elif year >= 1987:
+        start = _nth_weekday(year, 4, 6, 1)
+        end = _nth_weekday(year, 10, 6, -1)
+    elif year >= 1967:
+        start = _nth_weekday(year, 4, 6, -1)
+        end = _nth_weekday(year, 10, 6, -1)
+    else:
+        return False
+    return start + datetime.timedelta(hours=2) <= local_standard < end + datetime.timedelta(hours=1)
+
+def to_local(instant: datetime.datetime, tz: float, dst: bool) -> datetime.datetime:
+    """ Convert a UT instant to local time for a fixed offset, optionally with US DST. """
+    local = instant + datetime.timedelta(hours=tz)
+    if dst and us_dst_in_effect(local):
+        local += datetime.timedelta(hours=1)
+    return local
+
+def _phenom_entry(phenom: str, instant: datetime.datetime) -> dict:
+    """ Format an instant the way the USNO API reports it, rounded to the minute. """
+    rounded = (instant + datetime.timedelta(seconds=30)).replace(second=0, microsecond=0)
+    return {"phenom": phenom,
+            "year": rounded.year,
+            "month": rounded.month,
+            "day": rounded.day,
+            "time": rounded.strftime('%H:%M')}
+
+def seasons(year: int, tz: float = -6, dst: bool = True) -> dict:
+    """ Earth seasons and apsides for a year, shaped like the USNO 'seasons' response. """
+    events = [
+        ("Perihelion", apsis_instant(year, aphelion=False)),
+        ("Equinox", season_instant(year, 0)),
+        ("Solstice", season_instant(year, 1)),
+        ("Aphelion", apsis_instant(year, aphelion=True)),
+        ("Equinox", season_instant(year, 2)),
+        ("Solstice", season_instant(year, 3)),
+    ]
+    return {"year": year,
+            "tz": tz,
+            "dst": dst,
+            "data": [_phenom_entry(phenom, to_local(instant, tz, dst))
+                     for phenom, instant in events]}
+
+def moon_phases(start: datetime.date, nump: int) -> dict:
+    """ The next nump moon phases from a UT date, shaped like the USNO 'moon/phases/date' response. """
+    start_instant = datetime.datetime(start.year, start.month, start.day)
+    decimal_year = start.year + (start.timetuple().tm_yday - 1) / 365.25
+    quarter = math.floor((decimal_year - 2000) * 12.3685) * 4 - 4
+    phasedata: List[dict] = []
+    while len(phasedata) < nump:
+        instant = moon_phase_instant(quarter / 4)
+        if instant >= start_instant:
+            phasedata.append(_phenom_entry(PHASE_NAMES[quarter % 4], instant))
+        quarter += 1
+    for entry in phasedata:
+        entry["phase"] = entry.pop("phenom")
+    return {"year": start.year,
+            "month": start.month,
+            "day": start.day,
+            "numphases": nump,
+            "phasedata": phasedata}
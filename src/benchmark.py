@@ -0,0 +1,273 @@
+""" Benchmark suite: python -m benchmark [--output results.json] [--compare previous.json]
+
+Runs in a scratch directory against a local USNO stand-in (usno_stub), so no network is used.
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional
+import calculate_dates
+import data_sources
+from calculate_dates import (calculate_dates_range, get_holidays, get_holidays_range,
+                             prefetch, api_cache, source_stats)
+from database import database, db_setup
+from generators import generate_summary, iter_export
+from holiday_cache import holiday_cache
+from http_client import shared_client
+from usno_stub import StubServer, generate_fixtures, record_fixtures
+
+SINGLE_YEAR = 2025
+RANGE = (1701, 2100)
+
+@dataclass
+class Result():
+    """ Timings of one benchmark. """
+    name: str
+    seconds: float
+    median_seconds: float
+    peak_bytes: int
+    items: int
+    items_per_second: float
+    skipped: Optional[str] = None
+
+class Suite():
+    """ Run benchmarks in a scratch directory, each with a fresh or warmed state. """
+    def __init__(self, directory: str, repeat: int):
+        self.directory = directory
+        self.repeat = repeat
+        self.results: List[Result] = []
+        self.databases = 0
+
+    def cold_database(self):
+        """ Point the DB layer at a new, empty database and drop in-process caches. """
+        self.databases += 1
+        database.configure(os.path.join(self.directory, f"cold_{self.databases}.db"))
+        db_setup()
+        holiday_cache.invalidate()
+
+    @staticmethod
+    def warm_database():
+        """ Keep the current database, but drop in-process caches. """
+        holiday_cache.invalidate()
+
+    def run(self, name: str, func: Callable[[], int], setup: Optional[Callable] = None):
+        """ Time func, which returns how many items it produced, then trace its peak memory. """
+        times = []
+        items = 0
+        for _ in range(self.repeat):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            items = func()
+            times.append(time.perf_counter() - start)
+        if setup:
+            setup()
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        best = min(times)
+        result = Result(name, best, statistics.median(times), peak, items,
+                        items / best if best else 0.0)
+        self.results.append(result)
+        print(f"{name:40} {best * 1000:10.2f} ms {peak / 2**20:8.1f} MiB {items:8d} items")
+
+    def skip(self, name: str, reason: str):
+        """ Record a benchmark that cannot run here. """
+        self.results.append(Result(name, 0.0, 0.0, 0, 0, 0.0, skipped=reason))
+        print(f"{name:40} skipped: {reason}")
+
+def count(iterable) -> int:
+    """ Consume an iterable, returning its length. """
+    return sum(1 for _ in iterable)
+
+def engine_benchmarks(suite: Suite):
+    """ Holiday calculation with the built-in astronomical engine. """
+    start, end = RANGE
+    suite.run("calculate_dates/engine/1-year",
+              lambda: len(calculate_dates_range(SINGLE_YEAR, SINGLE_YEAR)[SINGLE_YEAR]))
+    suite.run("calculate_dates/engine/400-year",
+              lambda: sum(len(each or ()) for each in calculate_dates_range(start, end).values()))
+
+def api_benchmarks(suite: Suite):
+    """ Holiday calculation from the USNO stand-in, with a cold HTTP cache. """
+    start, end = RANGE
+
+    def api_range(first: int, last: int) -> int:
+        prefetch(range(first, last + 1), use_api=True)
+        holidays = calculate_dates_range(first, last, use_api=True)
+        return sum(len(each or ()) for each in holidays.values())
+
+    def cold_http():
+        api_cache().clear()
+        suite.cold_database()
+
+    suite.run("calculate_dates/api-cold/1-year", lambda: api_range(SINGLE_YEAR, SINGLE_YEAR),
+              setup=cold_http)
+    suite.run("calculate_dates/api-cold/400-year", lambda: api_range(start, end), setup=cold_http)
+    suite.run("calculate_dates/api-warm/400-year", lambda: api_range(start, end),
+              setup=suite.warm_database)
+
+def storage_benchmarks(suite: Suite):
+    """ get_holidays through the DB (table disabled), the shipped table and the memory cache. """
+    start, end = RANGE
+    calculate_dates.USE_TABLE = False
+    try:
+        suite.run("get_holidays/db-cold/1-year", lambda: len(get_holidays(SINGLE_YEAR)),
+                  setup=suite.cold_database)
+        suite.run("get_holidays/db-warm/1-year", lambda: len(get_holidays(SINGLE_YEAR)),
+                  setup=suite.warm_database)
+        suite.run("get_holidays_range/db-cold/400-year",
+                  lambda: count(get_holidays_range(start, end)), setup=suite.cold_database)
+        suite.run("get_holidays_range/db-warm/400-year",
+                  lambda: count(get_holidays_range(start, end)), setup=suite.warm_database)
+    finally:
+        calculate_dates.USE_TABLE = True
+    suite.run("get_holidays_range/table/400-year",
+              lambda: count(get_holidays_range(start, end)), setup=suite.warm_database)
+    suite.run("get_holidays_range/memory/400-year",
+              lambda: count(get_holidays_range(start, end)))
+
+def export_benchmarks(suite: Suite):
+    """ Export throughput from already-cached holidays. """
+    start, end = RANGE
+    holidays = list(get_holidays_range(start, end))
+
+    def summary() -> int:
+        generate_summary(holidays)
+        return len(holidays)
+
+    def export(export_format: str) -> int:
+        for _ in iter_export(export_format, holidays):
+            pass
+        return len(holidays)
+
+    suite.run("generate_summary/400-year", summary)
+    for export_format in ("ics", "json", "csv", "summary"):
+        suite.run(f"export/{export_format}/400-year",
+                  lambda export_format=export_format: export(export_format))
+
+def ui_benchmarks(suite: Suite):
+    """ UI.submit from click to the last Table View row, if a display is available. """
+    try:
+        import tkinter as tk # pylint: disable=import-outside-toplevel
+        from ui import UI # pylint: disable=import-outside-toplevel
+        root = tk.Tk()
+    except (ImportError, RuntimeError) as ui_error:
+        suite.skip("ui/submit/400-year", str(ui_error))
+        return
+    except Exception as ui_error: # pylint: disable=broad-exception-caught
+        suite.skip("ui/submit/400-year", f"no display: {ui_error}")
+        return
+    ui = UI(root)
+
+    def submit() -> int:
+        ui.clear()
+        ui.start_year_selector.set(str(RANGE[0]))
+        ui.end_year_selector.set(str(RANGE[1] - 1))
+        ui.submit()
+        while ui.worker is not None or ui.fill_job is not None:
+            root.update()
+        return len(ui.table_model)
+
+    suite.run("ui/submit/400-year", submit, setup=suite.warm_database)
+    root.destroy()
+
+def git_revision() -> Optional[str]:
+    """ Current commit, if running from a git checkout. """
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+                              ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: List[Result], previous_path: str):
+    """ Print each benchmark's time relative to a previous results file. """
+    with open(previous_path, encoding="utf-8") as previous_file:
+        previous = {each["name"]: each for each in json.load(previous_file)["results"]}
+    print(f"\nCompared with {previous_path}:")
+    for result in results:
+        before = previous.get(result.name)
+        if result.skipped or not before or before.get("skipped") or not before["seconds"]:
+            continue
+        print(f"{result.name:40} {result.seconds / before['seconds']:6.2f}x time, "
+              f"{result.peak_bytes / max(before['peak_bytes'], 1):6.2f}x memory")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """ Run the suite and write its results as JSON. """
+    # pylint: disable=too-many-locals
+    parser = argparse.ArgumentParser(prog="python -m benchmark", description=__doc__)
+    parser.add_argument("-o", "--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark")
+    parser.add_argument("--latency", type=float, default=0.02,
+                        help="seconds the USNO stand-in waits before each response")
+    parser.add_argument("--fixtures", help="fixture directory (default: generated from the engine)")
+    parser.add_argument("--record", action="store_true",
+                        help="record missing fixtures from the live USNO API first")
+    parser.add_argument("--skip", action="append", default=[],
+                        choices=["engine", "api", "storage", "export", "ui"])
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    output = os.path.abspath(args.output)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        fixtures = os.path.abspath(args.fixtures or os.path.join(scratch, "fixtures"))
+        fixture_years = range(RANGE[0] - 1, RANGE[1] + 2)
+        if args.record:
+            record_fixtures(fixtures, fixture_years)
+        generate_fixtures(fixtures, fixture_years)
+        previous_directory = os.getcwd()
+        # The HTTP cache and any stray databases live in the scratch directory
+        os.chdir(scratch)
+        suite = Suite(scratch, args.repeat)
+        try:
+            with StubServer(fixtures, args.latency) as stub:
+                data_sources.API_BASE = stub.base_url
+                suite.cold_database()
+                benchmarks = {"engine": engine_benchmarks, "api": api_benchmarks,
+                              "storage": storage_benchmarks, "export": export_benchmarks,
+                              "ui": ui_benchmarks}
+                for name, benchmark in benchmarks.items():
+                    if name not in args.skip:
+                        benchmark(suite)
+                stub_requests = stub.requests
+        finally:
+            database.close()
+            api_cache().close()
+            os.chdir(previous_directory)
+
+    report: Dict = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "latency": args.latency,
+            "stub_requests": stub_requests,
+            "sources": source_stats(),
+            "http": shared_client().stats(),
+        },
+        "results": [asdict(result) for result in suite.results],
+    }
+    with open(output, 'w', encoding="utf-8") as output_file:
+        json.dump(report, output_file, indent=2)
+    print(f"\nResults written to {output}")
+    if args.compare:
+        compare(suite.results, args.compare)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
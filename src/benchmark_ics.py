@@ -0,0 +1,70 @@
+""" Benchmark the streaming ICS writer against the ics library and check they agree. """
+import argparse
+import datetime
+import io
+import logging
+import time
+import tracemalloc
+from typing import Callable, List, Tuple
+from ics import Calendar, Event
+from calculate_dates import Holiday, get_holidays_range
+from database import db_setup
+from ics_writer import write_calendar
+
+# Properties that legitimately differ between the two writers
+VOLATILE = ("UID", "DTSTAMP", "PRODID", "CALSCALE")
+
+def ics_library(output: io.StringIO, holidays: List[Holiday]) -> None:
+    """ The previous export path: build an ics.Calendar in memory, then serialize it. """
+    calendar = Calendar()
+    for holiday in holidays:
+        event = Event()
+        event.name = holiday.name
+        event.begin = datetime.datetime.strptime(holiday.start_date, '%Y-%m-%d')
+        event.description = f"Description: {holiday.description}\nSchedule: {holiday.schedule}"
+        if holiday.end_date is not None:
+            event.end = datetime.datetime.strptime(holiday.end_date, '%Y-%m-%d')
+        event.make_all_day()
+        calendar.events.add(event)
+    output.writelines(calendar.serialize_iter())
+
+def events(text: str) -> List[Tuple[str, ...]]:
+    """ Unfolded, order-independent VEVENT contents without volatile properties. """
+    lines = text.replace("\r\n ", "").replace("\r\n", "\n").split("\n")
+    found, current = [], []
+    for line in lines:
+        if line == "BEGIN:VEVENT":
+            current = []
+        elif line == "END:VEVENT":
+            found.append(tuple(sorted(current)))
+        elif not line.startswith(VOLATILE):
+            current.append(line)
+    return sorted(found)
+
+def measure(writer: Callable, holidays: List[Holiday]) -> Tuple[str, float, int]:
+    """ Output, seconds taken and peak traced memory of one writer. """
+    output = io.StringIO()
+    tracemalloc.start()
+    start = time.perf_counter()
+    writer(output, iter(holidays))
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return output.getvalue(), elapsed, peak
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("start", type=int, nargs="?", default=1701)
+    parser.add_argument("end", type=int, nargs="?", default=2100)
+    args = parser.parse_args()
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s',
+                        level=logging.WARNING)
+    db_setup()
+    all_holidays = list(get_holidays_range(args.start, args.end))
+    # Output is kept in memory, so peak memory includes it for both writers
+    streamed, streamed_time, streamed_peak = measure(write_calendar, all_holidays)
+    library, library_time, library_peak = measure(ics_library, all_holidays)
+    print(f"{len(all_holidays)} holidays, years {args.start}-{args.end}")
+    print(f"ics library: {library_time:8.3f} s, peak {library_peak / 2**20:7.1f} MiB")
+    print(f"streaming:   {streamed_time:8.3f} s, peak {streamed_peak / 2**20:7.1f} MiB")
+    print("Equivalent output:", events(streamed) == events(library))
@@ -0,0 +1,8 @@
+""" Build the precomputed holiday table shipped with the application. """
+import logging
+from calculate_dates import build_holiday_table
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s',
+                        level=logging.INFO)
+    build_holiday_table()
@@ -1,20 +1,41 @@
 """ Module to calculate Norse Calendar dates. """
 # pylint: disable=line-too-long
 import datetime
+import functools
+import itertools
 import logging
-import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import List, Optional
-import urllib3
-import certifi
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import astronomy
+from http_cache import ResponseCache
+from http_client import shared_client
+from data_sources import (USNO_MAX_PHASES, CacheSource, DataSource, LocalSource, SourceChain,
+                          USNOSource)
+from database import HolidayRow, database
+from holiday_cache import holiday_cache
+from holiday_rules import NORSE_CALENDAR, MoonIndex, RuleGraph
+from holiday_table import TABLE_PATH, HolidayTable, load_table, rules_fingerprint, write_table
+from metrics import span, timed
 
-# Initialize HTTP Pool Manager
-http = urllib3.PoolManager(
-    cert_reqs="CERT_REQUIRED",
-    ca_certs=certifi.where()
-)
+# Use the USNO API instead of the built-in engine
+USE_API = False
+# Maximum concurrent API requests when prefetching a range of years
+API_WORKERS = 8
+# Years covered by the precomputed holiday table
+TABLE_YEARS = (1701, 2100)
+# Read holidays from the precomputed table when it covers the year
+USE_TABLE = True
+# Time zone (hours from UT) and US daylight saving used for equinoxes and solstices
+TIMEZONE = -6
+DST = True
 
-@dataclass
+@functools.lru_cache(maxsize=None)
+def api_cache() -> ResponseCache:
+    """ Shared on-disk cache for API responses, opened on first use. """
+    return ResponseCache(shared_client())
+
+@dataclass(frozen=True)
 class Holiday():
     """ Class containing definition of 'Holiday' object."""   
     name: str
@@ -29,21 +50,87 @@ class MoonPhase:
     phase: str
     date: datetime.datetime
 
-def get_core_dates(year: int) -> dict:
-    """ Get Core Dates from API. """
+@functools.lru_cache(maxsize=None)
+def usno_source() -> DataSource:
+    """ The live USNO API, through the shared response cache. """
+    return USNOSource(api_cache)
+
+# Source chains by use_api, built on first use
+source_chains: Dict[bool, DataSource] = {}
+
+def resolve_use_api(use_api: Optional[bool]) -> bool:
+    """ use_api, or the current USE_API setting when it is None. """
+    return USE_API if use_api is None else use_api
+
+def data_source(use_api: Optional[bool] = None) -> DataSource:
+    """ Source chain for astronomical data: fresh stored responses, then the API (which
+    revalidates stale ones), then stale stored responses, then the engine. """
+    use_api = resolve_use_api(use_api)
+    if use_api not in source_chains:
+        if use_api:
+            # Keep working, on old responses or the built-in engine, when the API is down
+            source_chains[use_api] = SourceChain([CacheSource(api_cache), usno_source(),
+                                                  CacheSource(api_cache, fresh_only=False),
+                                                  LocalSource()])
+        else:
+            source_chains[use_api] = SourceChain([LocalSource()])
+    return source_chains[use_api]
+
+def source_stats() -> Dict[str, Dict[str, dict]]:
+    """ Request counts and latency of every source chain used so far, by chain. """
+    return {("api" if use_api else "engine"): chain.report()
+            for use_api, chain in source_chains.items()}
+
+@timed("prefetch")
+def prefetch(years: Iterable[int], use_api: Optional[bool] = None) -> None:
+    """ Fetch the API data for every year not yet in the DB, concurrently and without duplicates. """
+    if not resolve_use_api(use_api):
+        return
+    years = list(years)
+    if not years:
+        return
+    stored = database.stored_years(min(years), max(years), fingerprint())
+    missing = [year for year in years if year not in stored]
+    requests = sorted({("seasons", season_year) for year in missing
+                       for season_year in (year - 1, year)} |
+                      {("moon", year) for year in missing})
+    if not requests:
+        return
+    source = data_source(True)
+
+    def fetch(request: Tuple[str, int]) -> dict:
+        """ Warm the source chain with one request. """
+        kind, year = request
+        if kind == "seasons":
+            return source.seasons(year, TIMEZONE, DST)
+        return source.moon_phases(datetime.date(year, 1, 1), USNO_MAX_PHASES)
+
+    logging.info("Prefetching %d API resources", len(requests))
+    with ThreadPoolExecutor(max_workers=min(API_WORKERS, len(requests))) as pool:
+        list(pool.map(fetch, requests))
+    logging.info("Prefetch complete")
+
+@timed("get_core_dates")
+def get_core_dates(year: int, use_api: Optional[bool] = None, source: Optional[DataSource] = None) -> dict:
+    """ Get Core Dates from the built-in engine, or from the API if requested. """
     logging.info("Retrieving Core Dates for year %d", year)
-    phenom_api = f"https://aa.usno.navy.mil/api/seasons?year={year}&tz=-6&dst=true"
-    phenoms = http.request("GET", phenom_api)
-    phenoms_json = phenoms.json()
+    phenoms_json = (source or data_source(use_api)).seasons(year, TIMEZONE, DST)
     logging.info("Core Dates Retrieved for year %d", year)
     return phenoms_json
 
-def get_moon_phases(year: int) -> List[MoonPhase]:
-    """ Get Moon Phases from API. """
+@timed("get_moon_phases")
+def get_moon_phases(year: int, use_api: Optional[bool] = None,
+                    source: Optional[DataSource] = None) -> List[MoonPhase]:
+    """ Get Moon Phases from the built-in engine, or from the API if requested. """
     logging.info("Retrieving Moon Phases for year %d", year)
-    moon_api = f"https://aa.usno.navy.mil/api/moon/phases/date?date={year}-01-01&nump=99"
-    moons = http.request("GET", moon_api)
-    moons_json = moons.json()
+    moons_json = (source or data_source(use_api)).moon_phases(datetime.date(year, 1, 1),
+                                                              USNO_MAX_PHASES)
+    all_moons = parse_moon_phases(moons_json)
+    logging.info("Moon Phases Retrieved for year %d", year)
+    return all_moons
+
+def parse_moon_phases(moons_json: dict) -> List[MoonPhase]:
+    """ Convert a moon phases response into MoonPhase objects. """
     all_moons = []
     for moon in range(moons_json['numphases']):
         phase = moons_json['phasedata'][moon]['phase']
@@ -52,354 +139,223 @@ def get_moon_phases(year: int) -> List[MoonPhase]:
             moons_json['phasedata'][moon]['month'],
             moons_json['phasedata'][moon]['day'])
         all_moons.append(MoonPhase(phase=phase,date=date))
-    logging.info("Moon Phases Retrieved for year %d", year)
     return all_moons
 
-def calculate_dates(year: int) -> List[Holiday] | None:
+@timed("get_moon_timeline")
+def get_moon_timeline(start: int, end: int, use_api: Optional[bool] = None) -> List[MoonPhase]:
+    """ Get one continuous, sorted list of Moon Phases covering holidays from start to end. """
+    logging.info("Loading Moon Phases for years %d-%d", start, end)
+    if resolve_use_api(use_api):
+        # The API returns at most 99 phases per request, so merge overlapping yearly windows
+        unique = {}
+        for year in range(start, end + 1):
+            for moon in get_moon_phases(year, use_api):
+                unique[(moon.date, moon.phase)] = moon
+        return sorted(unique.values(), key=lambda moon: moon.date)
+    # Each year's holidays reach into the following spring, about 50 phases per year
+    moons_json = data_source(False).moon_phases(datetime.date(start, 1, 1),
+                                                (end - start + 2) * 50)
+    return parse_moon_phases(moons_json)
+
+def cross_check(year: int) -> bool:
+    """ Compare built-in engine dates against the USNO API, logging any mismatch. """
+    logging.info("Cross-checking built-in engine against API for year %d", year)
+    matches = True
+    local_core = get_core_dates(year, use_api=False)['data']
+    # Ask the API itself, not a chain that could fall back to the engine
+    api_core = get_core_dates(year, source=usno_source())['data']
+    for local, remote in zip(local_core, api_core):
+        local_date = (local['year'], local['month'], local['day'])
+        remote_date = (remote['year'], remote['month'], remote['day'])
+        if local_date != remote_date:
+            logging.warning("%s mismatch for year %d: engine %s, API %s",
+                            local['phenom'], year, local_date, remote_date)
+            matches = False
+    local_moons = get_moon_phases(year, use_api=False)
+    api_moons = get_moon_phases(year, source=usno_source())
+    for local, remote in zip(local_moons, api_moons):
+        if (local.phase, local.date) != (remote.phase, remote.date):
+            logging.warning("Moon phase mismatch for year %d: engine %s %s, API %s %s",
+                            year, local.phase, local.date, remote.phase, remote.date)
+            matches = False
+    return matches
+
+@timed("calculate_dates")
+def calculate_dates(year: int, use_api: Optional[bool] = None) -> List[Holiday] | None:
     """ Calculate Holiday dates and return array of class Holiday. """
-    holidays = []
-    logging.info("Calculating holidays for year %d", year)
+    return calculate_dates_range(year, year, use_api)[year]
 
-    phenoms_json = get_core_dates(year)
-    phenoms_prev_json = get_core_dates(year - 1)
+@timed("calculate_dates_range")
+def calculate_dates_range(start: int, end: int, use_api: Optional[bool] = None,
+                          rules: RuleGraph = NORSE_CALENDAR) -> Dict[int, List[Holiday] | None]:
+    """ Calculate Holiday dates for every year from start to end from one shared timeline. """
+    logging.info("Calculating holidays for years %d-%d", start, end)
+    all_phenoms = {year: get_core_dates(year, use_api) for year in range(start - 1, end + 1)}
+    moons = MoonIndex(get_moon_timeline(start, end, use_api))
+    all_inputs = {}
+    for year in range(start, end + 1):
+        # Create inputs from equinoxes and solstices
+        if len(all_phenoms[year]['data']) < 6 or len(all_phenoms[year - 1]['data']) < 6:
+            logging.error("Insufficient data from phenom API for year %d.", year)
+            continue
+        all_inputs[year] = season_inputs(all_phenoms[year], all_phenoms[year - 1])
+    with span("evaluate_rules"):
+        results = rules.evaluate_years(all_inputs, moons)
+    return {year: to_holidays(rules, results[year]) if year in results else None
+            for year in range(start, end + 1)}
 
-    # Create Holiday objects for equinoxes and solstices
-    if len(phenoms_json['data']) < 6 or len(phenoms_prev_json['data']) < 6:
-        logging.error("Insufficient data from phenom API for year %d.", year)
-        return None
+def season_inputs(phenoms_json: dict, phenoms_prev_json: dict) -> Dict[str, datetime.datetime]:
+    """ Rule inputs for a year from its seasons and the previous year's. """
+    def phenom_date(data: dict) -> datetime.datetime:
+        """ Date of an API phenomenon entry. """
+        return datetime.datetime(data['year'], data['month'], data['day'])
 
-    holidays.append(Holiday(
-        "Spring Equinox",
-        datetime.datetime(phenoms_json['data'][1]['year'],
-                          phenoms_json['data'][1]['month'],
-                          phenoms_json['data'][1]['day'])))
-    holidays.append(Holiday(
-        "Summer Solstice",
-        datetime.datetime(phenoms_json['data'][2]['year'],
-                          phenoms_json['data'][2]['month'],
-                          phenoms_json['data'][2]['day'])))
-    holidays.append(Holiday(
-        "Fall Equinox",
-        datetime.datetime(phenoms_json['data'][4]['year'],
-                          phenoms_json['data'][4]['month'],
-                          phenoms_json['data'][4]['day'])))
-    holidays.append(Holiday(
-        "Winter Solstice",
-        datetime.datetime(phenoms_json['data'][5]['year'],
-                          phenoms_json['data'][5]['month'],
-                          phenoms_json['data'][5]['day'])))
-
-    # Get Moon Phases
-    all_moons = get_moon_phases(year)
-
-    def next_new_moon(input_date: datetime.datetime) -> datetime.datetime:
-        """ Get Next New Moon Date."""
-        for moon_counter in all_moons:
-            if moon_counter.date > input_date and moon_counter.phase == "New Moon":
-                return moon_counter.date
-        return datetime.datetime(0,0,0)
-
-    def next_full_moon(input_date: datetime.datetime) -> datetime.datetime:
-        """ Get Next Full Moon Date."""
-        for moon_counter in all_moons:
-            if moon_counter.date > input_date and moon_counter.phase == "Full Moon":
-                return moon_counter.date
-        return datetime.datetime(0,0,0)
-
-    def previous_full_moon(input_date: datetime.datetime) -> datetime.datetime:
-        """ Get Previous Full Moon Date."""
-        for moon_counter in reversed(all_moons):
-            if moon_counter.date < input_date and moon_counter.phase == "Full Moon":
-                return moon_counter.date
-        return datetime.datetime(0,0,0)
-
-    def closest_full_moon(input_date: datetime.datetime) -> datetime.datetime:
-        """ Get Closest Full Moon Date. """
-
-        days_before = input_date - previous_full_moon(input_date)
-        days_after = next_full_moon(input_date) - input_date
-        if days_before < days_after:
-            return previous_full_moon(input_date)
-        return next_full_moon(input_date)
-
-    def previous_thursday(input_date: datetime.datetime) -> datetime.datetime:
-        """ Get Previous Thursday Date. """
-        while input_date.weekday() != 3:
-            input_date -= datetime.timedelta(days=1)
-        return input_date
-
-    # Calculate Holidays
-    holidays.append(Holiday(
-        "Yule",
-        holidays[
-            next(i for i, x in enumerate(holidays) if x.name == 'Winter Solstice')
-        ].start_date,
-        holidays[
-            next(i for i, x in enumerate(holidays) if x.name == 'Winter Solstice')
-        ].start_date + datetime.timedelta(days=12),
-        "12 day celebration, each day celebrating a different God/Goddess/community/kin",
-        "Start: Winter Solstice, End: 12 days after the Winter Solstice."
-    ))
-    holidays.append(Holiday(
-        "Thorrablot",
-        next_full_moon(next_new_moon(holidays[
-            next(i for i, x in enumerate(holidays) if x.name == 'Winter Solstice')
-        ].start_date)),
-        None,
-        "Welcoming Old man winter and Thor into the home to allow them to warm up after a cold winter",
-        "The full moon after the new moon following the Winter Solstice."
-    ))
-    holidays.append(Holiday(
-        "Disting",
-        next_full_moon(holidays[
-            next(i for i, x in enumerate(holidays) if x.name == 'Thorrablot')
-        ].start_date),
-        None,
-        "Celebration of Freya and the love in your life",
-        "The full moon after the Thorrablot."
-    ))
-    holidays.append(Holiday(
-        "Mid-Winter",
-        holidays[
-            next(i for i, x in enumerate(holidays) if x.name == 'Thorrablot')
-        ].start_date,
-        next_new_moon(holidays[
-            next(i for i, x in enumerate(holidays) if x.name == 'Thorrablot')
-        ].start_date),
-        "Marks the year's longest night and the symbolic rebirth of the sun",
-        "Start: Thorrablot, End: Next New Moon"
-    ))
-    holidays.append(Holiday(
-        "Lenzen",
-        previous_full_moon(holidays[
-            next(i for i, x in enumerate(holidays) if x.name == 'Spring Equinox')
-        ].start_date),
-        next_full_moon(holidays[
-            next(i for i, x in enumerate(holidays) if x.name == 'Spring Equinox')
-        ].start_date),
-        "Comes in a perilous time in spring when food supplies that were stored for the winter were running low and new sources were not available yet, fasting during this time is used to honor those who suffered with hunger and famine",
-        "Start: Full moon before the Spring Equinox, End: Full moon after the Spring Equinox"
-    ))
-    holidays.append(Holiday(
-        "Offering to Freya",
-        holidays[
-            next(i for i, x in enumerate(holidays) if x.name == 'Spring Equinox')
-        ].start_date,
-        None,
-        "Celebrates Freya's gift of fertility over the land and her hand in making spring come",
-        "The Spring Equinox"
-    ))
-    holidays.append(Holiday(
-        "Ostara",
-        next_full_moon(holidays[
-            next(i for i, x in enumerate(holidays) if x.name == 'Spring Equinox')
-        ].start_date),
-        None,
-        "A celebration of spring, making it through the winter. Celebrating Idunn, freya, Ostara",
-        "The full moon after the Spring Equinox."
-    ))
-    holidays.append(Holiday(
-        "Sigrblot",
-        next_new_moon(holidays[
-            next(i for i, x in enumerate(holidays) if x.name == 'Ostara')
-        ].start_date),
-        None,
-        "Marks the start of campaigning season where weather was getting warmer, Offering sacrifices for victories in battle",
-        "The new moon after Ostara."
-    ))
-    holidays.append(Holiday(
-        "Summer Nights Holy Tide",
-        holidays[
-            next(i for i, x in enumerate(holidays) if x.name == 'Ostara')
-        ].start_date,
-        holidays[
-            next(i for i, x in enumerate(holidays) if x.name == 'Sigrblot')
-        ].start_date,
-        "The spring festival that marked the beginning of the Norse year's summer season",
-        "Start: Ostara, End: Sigrblot"
-    ))
-    holidays.append(Holiday(
-        "Mid-Summer",
-        holidays[
-            next(i for i, x in enumerate(holidays) if x.name == 'Summer Solstice')
-        ].start_date,
-        None,
-        "Marks the peak power of the sun goddess Sol (Sunna), celebrating the shortest night of the year",
-        "The Summer Solstice"
-    ))
-    holidays.append(Holiday(
-        "Lammas",
-        closest_full_moon(holidays[
-            next(i for i, x in enumerate(holidays) if x.name == 'Fall Equinox')
-        ].start_date),
-        None,
-        "Marks the start of the Harvest season (Gratitude for hard work leading to abundance)",
-        "The full moon closest to the Fall Equinox."
-    ))
-    holidays.append(Holiday(
-        "Hausblot",
-        next_new_moon(holidays[
-            next(i for i, x in enumerate(holidays) if x.name == 'Lammas')
-        ].start_date),
-        None,
-        "Celebration of giving thanks for the bountiful harvest and time to prepare for the coming winter",
-        "The new moon after Lammas."
-    ))
-    holidays.append(Holiday(
-        "Harvest Home Holy Tide",
-        holidays[
-            next(i for i, x in enumerate(holidays) if x.name == 'Lammas')
-        ].start_date,
-        holidays[
-            next(i for i, x in enumerate(holidays) if x.name == 'Hausblot')
-        ].start_date,
-        "Marks the end of the summer season, serving as the major harvest and community celebration",
-        "Start: Lammas, End: Hausblot"
-    ))
-
-    holidays.append(Holiday(
-        "Alfablot",
-        next_full_moon(next_full_moon(holidays[
-            next(i for i, x in enumerate(holidays) if x.name == 'Fall Equinox')
-        ].start_date)),
-        None,
-        "Remembering the fallen male ancestors and offerings to honor the protective spirits of the land",
-        "The two full moons after the Fall Equinox."
-    ))
-
-    holidays.append(Holiday(
-        "Disablot",
-        next_new_moon(holidays[
-            next(i for i, x in enumerate(holidays) if x.name == 'Alfablot')
-        ].start_date),
-        None,
-        "Remembering the fallen female ancestors and offerings to honor the family protective spirits",
-        "The new moon after the Alfablot."
-    ))
-
-    holidays.append(Holiday(
-        "Winters Nights Holy Tide",
-        holidays[
-            next(i for i, x in enumerate(holidays) if x.name == 'Alfablot')
-        ].start_date,
-        holidays[
-            next(i for i, x in enumerate(holidays) if x.name == 'Disablot')
-        ].start_date,
-        "Starts a series of sacrifices celebrating love for friends and family and those who have fallen",
-        "Start: Alfablot, End: Disablot"
-    ))
-
-    holidays.append(Holiday(
-        "Welcome Goi and Freya",
-        #feb 1st
-        datetime.datetime(year, 2, 1),
-        None,
-        "Welcoming Goi and Freya into the home to warm up and thanking them for the spring time to come",
-        "February 1st"
-    ))
-
-    holidays.append(Holiday(
-        "Loki Day",
-        #April 1st
-        datetime.datetime(year, 4, 1),
-        None,
-        "A day for pranks and tricks, made in honor of the trickster god",
-        "April 1st"
-    ))
-
-    holidays.append(Holiday(
-        "Lokabrenna",
-        #July 13th
-        datetime.datetime(year, 7, 13),
-        None,
-        "Honoring Loki’s transformative fire, often involving rituals to 'burn away' stagnant energy or personal obstacles",
-        "July 13th"
-    ))
-
-    holidays.append(Holiday(
-        "Walpurgisnacht",
-        #April 30th
-        datetime.datetime(year, 4, 30),
-        None,
-        "Marks the official end of winter and the beginning of spring",
-        "April 30th"
-    ))
-
-    holidays.append(Holiday(
-        "Mayday",
-        #May 1st
-        datetime.datetime(year, 5, 1),
-        None,
-        "Celebrating the hope for triumph of our values: courageousness, solidarity, and generosity over selfishness and greed",
-        "May 1st"
-    ))
-
-    previous_winter_solstice = datetime.datetime(phenoms_prev_json['data'][5]['year'],
-                          phenoms_prev_json['data'][5]['month'],
-                          phenoms_prev_json['data'][5]['day'])
-
-    holidays.append(Holiday(
-        "Charming of the Plough",
-        #Halfway between Winter Solstice and Spring Equinox
-        (previous_winter_solstice + (((holidays[
-            next(i for i, x in enumerate(holidays) if x.name == 'Spring Equinox')
-        ].start_date) - previous_winter_solstice) / 2)),
-        None,
-        "The preparation for the start of the planting season",
-        "Halfway between previous Winter Solstice and Spring Equinox"
-    ))
-
-    # Add Sunwait holidays
-    for each in range(6):
-        sunwait = Holiday(
-            "Sunwait",
-            previous_thursday(holidays[
-                next(i for i, x in enumerate(holidays) if x.name == 'Winter Solstice')
-            ].start_date) - datetime.timedelta(days=each*7),
-            None,
-            "Each night celebrates the first 6 runes of Freya's Aett",
-            "Start: 6th Thursday before Winter Solstice, End: Thursday before Winter Solstice"
-        )
-        holidays.append(sunwait)
+    return {
+        "March Equinox": phenom_date(phenoms_json['data'][1]),
+        "June Solstice": phenom_date(phenoms_json['data'][2]),
+        "September Equinox": phenom_date(phenoms_json['data'][4]),
+        "December Solstice": phenom_date(phenoms_json['data'][5]),
+        "Previous December Solstice": phenom_date(phenoms_prev_json['data'][5]),
+    }
 
+def to_holidays(rules: RuleGraph, occurrences: dict) -> List[Holiday]:
+    """ Build Holiday objects from evaluated rules, sorted by start date. """
+    holidays = [Holiday(rule.name, start_date, end_date, rule.description, rule.schedule)
+                for rule in rules.rules.values()
+                for start_date, end_date in occurrences[rule.name]]
     # Sort holidays by start date
-    holidays = sorted(holidays, key=lambda holiday: holiday.start_date)
-    return holidays
-
-def get_holidays(year: int) -> List[Holiday]:
-    """ Read holidays from DB for a given year. """
-    conn = sqlite3.connect('norse_calendar.db')
-    cursor = conn.cursor()
-    if year not in [row[0] for row in cursor.execute('SELECT year FROM years').fetchall()]:
+    return sorted(holidays, key=lambda holiday: holiday.start_date)
+
+def shipped_table(year: int) -> Optional[HolidayTable]:
+    """ The precomputed holiday table, if it holds the year for the current rules and
+    settings. """
+    if USE_API or not USE_TABLE:
+        return None
+    table = load_table()
+    if table is not None and table.covers(year) and table.matches(fingerprint()):
+        return table
+    return None
+
+def build_holiday_table(path: str = TABLE_PATH) -> None:
+    """ Precompute every supported year into the holiday table file. """
+    start, end = TABLE_YEARS
+    write_table(path, calculate_dates_range(start, end, use_api=False), fingerprint())
+
+def fingerprint() -> bytes:
+    """ Identify the rule set and every setting that changes the calculated holidays. """
+    return rules_fingerprint(NORSE_CALENDAR, (TIMEZONE, DST, astronomy.ENGINE_VERSION))
+
+def cache_key(year: int) -> tuple:
+    """ Holiday cache key for a year under the current rules and settings. """
+    return (fingerprint(), year)
+
+def load_holidays(year: int) -> Tuple[Holiday, ...]:
+    """ Read holidays for a given year from the holiday table, or from the DB. """
+    table = shipped_table(year)
+    if table is not None:
+        logging.info("Retrieving holidays for year %d from holiday table.", year)
+        return tuple(Holiday(*row) for row in table.rows(year))
+    if year not in database.stored_years(year, year, fingerprint()):
         logging.info("Holidays for year %d not found in DB. Generating...", year)
         write_holidays(year)
     logging.info("Retrieving holidays for year %d from DB.", year)
-    cursor.execute('SELECT * FROM holidays WHERE start_date LIKE ?', (f'{year}%',))
-    rows = cursor.fetchall()
-    conn.close()
-    return [Holiday(*row[1:]) for row in rows]
+    return tuple(Holiday(*row) for row in database.read_holidays(year, fingerprint()))
+
+@timed("get_holidays")
+def get_holidays(year: int) -> Tuple[Holiday, ...]:
+    """ Holidays starting in a given year, from the in-process cache when possible. """
+    return holiday_cache.get(cache_key(year), lambda: load_holidays(year))
+
+def _read_years(start: int, end: int) -> Iterator[Tuple[int, Tuple[Holiday, ...]]]:
+    """ Read a run of years outside the holiday table from the DB with a single query. """
+    rows_by_year = itertools.groupby(database.iter_holidays(start, end, fingerprint()),
+                                     key=lambda row: int(row[1][:4]))
+    year = start
+    for row_year, rows in rows_by_year:
+        while year < row_year:
+            yield year, ()
+            year += 1
+        yield year, tuple(Holiday(*row) for row in rows)
+        year += 1
+    while year <= end:
+        yield year, ()
+        year += 1
+
+def get_holidays_range(start: int, end: int) -> Iterator[Holiday]:
+    """ Stream holidays starting from start to end, generating only the missing years first. """
+    if all(cache_key(year) in holiday_cache for year in range(start, end + 1)):
+        for year in range(start, end + 1):
+            yield from get_holidays(year)
+        return
+    write_holidays_range(start, end)
+    logging.info("Retrieving holidays for years %d-%d.", start, end)
+    year = start
+    while year <= end:
+        cached = holiday_cache.lookup(cache_key(year))
+        if cached is not None:
+            yield from cached
+            year += 1
+            continue
+        table = shipped_table(year)
+        if table is not None:
+            yield from holiday_cache.store(cache_key(year),
+                                           (Holiday(*row) for row in table.rows(year)))
+            year += 1
+            continue
+        # Read each run of uncached years outside the holiday table with a single query
+        run_end = year
+        while (run_end < end and shipped_table(run_end + 1) is None
+               and cache_key(run_end + 1) not in holiday_cache):
+            run_end += 1
+        for run_year, holidays in _read_years(year, run_end):
+            yield from holiday_cache.store(cache_key(run_year), holidays)
+        year = run_end + 1
 
+@timed("write_holidays")
 def write_holidays(year: int) -> None:
     """ Generate holidays for a given year and write to DB. """
     holidays = calculate_dates(year)
     # Write holidays to database
-    conn = sqlite3.connect('norse_calendar.db')
-    cursor = conn.cursor()
     if holidays is not None:
-        for holiday in holidays:
-            cursor.execute('''
-                INSERT INTO holidays (name, start_date, end_date, description, schedule)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                holiday.name,
-                holiday.start_date.strftime('%Y-%m-%d'),
-                holiday.end_date.strftime('%Y-%m-%d') if holiday.end_date else None,
-                holiday.description,
-                holiday.schedule
-            ))
-        cursor.execute('''
-                INSERT INTO years (year) VALUES (?)
-        ''', (year,))
-        conn.commit()
-        conn.close()
+        database.write_holidays({year: holiday_rows(holidays)}, fingerprint())
+        # Holidays can spill over into the following year
+        holiday_cache.invalidate((year, year + 1))
         logging.info("Holidays for year %d written to DB.", year)
+
+@timed("write_holidays_range")
+def write_holidays_range(start: int, end: int) -> None:
+    """ Generate holidays for every year from start to end missing from the DB, in one pass. """
+    stored = database.stored_years(start, end, fingerprint())
+    missing = [year for year in range(start, end + 1)
+               if year not in stored and shipped_table(year) is None]
+    if missing:
+        logging.info("Holidays for %d years not found in DB. Generating...", len(missing))
+        prefetch(missing)
+        runs = list(year_runs(missing))
+        rows_by_year = {}
+        # Stored and shipped years between the runs are not recalculated
+        for first, last in runs:
+            all_holidays = calculate_dates_range(first, last)
+            rows_by_year.update({year: holiday_rows(all_holidays[year])
+                                 for year in range(first, last + 1)
+                                 if all_holidays[year] is not None})
+        database.write_holidays(rows_by_year, fingerprint())
+        # Holidays can spill over into the following year
+        holiday_cache.invalidate(missing + [last + 1 for _, last in runs])
+        logging.info("Holidays for %d years in %d runs from %d-%d written to DB.",
+                     len(missing), len(runs), missing[0], missing[-1])
+
+def year_runs(years: List[int]) -> Iterator[Tuple[int, int]]:
+    """ First and last year of each run of consecutive years in a sorted list. """
+    for _, run in itertools.groupby(enumerate(years), lambda item: item[1] - item[0]):
+        run_years = [year for _, year in run]
+        yield run_years[0], run_years[-1]
+
+def holiday_rows(holidays: List[Holiday]) -> List[HolidayRow]:
+    """ Convert holidays to DB rows with ISO dates. """
+    return [(holiday.name,
+             holiday.start_date.strftime('%Y-%m-%d'),
+             holiday.end_date.strftime('%Y-%m-%d') if holiday.end_date else None,
+             holiday.description,
+             holiday.schedule)
+            for holiday in holidays]
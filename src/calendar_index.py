@@ -0,0 +1,47 @@
+""" Date and month indexes over loaded holidays for the Calendar tab. """
+import datetime
+from typing import Dict, Iterable, List, Tuple
+
+Month = Tuple[int, int]
+
+def _date(value: str) -> datetime.date:
+    """ Date of a stored '%Y-%m-%d' string. """
+    return datetime.date.fromisoformat(value)
+
+def neighbour_months(year: int, month: int) -> List[Month]:
+    """ A month with the months before and after it, as (year, month). """
+    index = year * 12 + month - 1
+    return [(each // 12, each % 12 + 1) for each in (index - 1, index, index + 1)]
+
+class CalendarIndex():
+    """ Holidays by every day they cover, and days with holidays by month. """
+    def __init__(self):
+        self.by_date: Dict[datetime.date, list] = {}
+        self.by_month: Dict[Month, List[datetime.date]] = {}
+
+    def add(self, holidays: Iterable) -> None:
+        """ Index holidays on each day from their start to their end date. """
+        for holiday in holidays:
+            start = _date(holiday.start_date)
+            end = _date(holiday.end_date) if holiday.end_date else start
+            day = start
+            while day <= end:
+                if day not in self.by_date:
+                    self.by_date[day] = []
+                    self.by_month.setdefault((day.year, day.month), []).append(day)
+                self.by_date[day].append(holiday)
+                day += datetime.timedelta(days=1)
+
+    def clear(self) -> None:
+        """ Forget every holiday. """
+        self.by_date.clear()
+        self.by_month.clear()
+
+    def on(self, day: datetime.date) -> list:
+        """ Holidays taking place on a day. """
+        return self.by_date.get(day, [])
+
+    def days_around(self, year: int, month: int) -> Iterable[datetime.date]:
+        """ Days with holidays in a month and its neighbours. """
+        for key in neighbour_months(year, month):
+            yield from self.by_month.get(key, ())
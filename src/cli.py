@@ -0,0 +1,126 @@
+""" Headless command line generator: python -m cli START [END] --format ics|json|csv|summary """
+import argparse
+import itertools
+import logging
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import IO, Dict, List, Optional, Tuple
+import metrics
+from calculate_dates import TABLE_YEARS, get_holidays_range
+from database import database, db_setup
+from generators import EXPORT_FORMATS, iter_export
+from ics_writer import format_stamp
+
+# Years rendered per worker process
+CHUNK_YEARS = 50
+
+def render_years(export_format: str, start: int, end: int, stamp: str
+                 ) -> Tuple[str, Dict[str, dict]]:
+    """ Worker process: holidays of a span of years, without the format's header or footer,
+    and the spans timed while rendering them. """
+    export = EXPORT_FORMATS[export_format]
+    with metrics.span("cli.render_years"):
+        body = export.separator.join(export.item(holiday, stamp)
+                                     for holiday in get_holidays_range(start, end))
+    return body, metrics.snapshot(reset=True)
+
+def year_chunks(start: int, end: int, chunk_years: int) -> List[Tuple[int, int]]:
+    """ Split a range of years into consecutive spans of at most chunk_years. """
+    return [(first, min(first + chunk_years - 1, end))
+            for first in range(start, end + 1, chunk_years)]
+
+@metrics.timed("cli.write_export")
+def write_export(output: IO[str], export_format: str, years: Tuple[int, int],
+                 workers: int = 1, chunk_years: int = CHUNK_YEARS) -> None:
+    """ Write holidays for a (start, end) range of years, rendering chunks in parallel if asked. """
+    start, end = years
+    stamp = format_stamp()
+    chunks = year_chunks(start, end, chunk_years)
+    if workers <= 1 or len(chunks) == 1:
+        output.writelines(iter_export(export_format, get_holidays_range(start, end), stamp))
+        return
+    export = EXPORT_FORMATS[export_format]
+    output.write(export.header)
+    # Spawned workers open their own DB connections; results are written in order
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks)),
+                             mp_context=multiprocessing.get_context("spawn"),
+                             initializer=metrics.enable if metrics.ENABLED else None) as pool:
+        bodies = pool.map(render_years, itertools.repeat(export_format),
+                          [chunk[0] for chunk in chunks], [chunk[1] for chunk in chunks],
+                          itertools.repeat(stamp))
+        written = False
+        for body, spans in bodies:
+            metrics.merge(spans)
+            if body:
+                if written:
+                    output.write(export.separator)
+                output.write(body)
+                written = True
+    output.write(export.footer)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """ Parse command line arguments. """
+    parser = argparse.ArgumentParser(prog="python -m cli",
+                                     description="Generate Norse Calendar holidays without a GUI.")
+    parser.add_argument("start", type=int, help="first year")
+    parser.add_argument("end", type=int, nargs="?", help="last year (defaults to start)")
+    parser.add_argument("-f", "--format", choices=sorted(EXPORT_FORMATS), default="ics",
+                        help="output format (default: ics)")
+    parser.add_argument("-o", "--output", default="-",
+                        help="output file, or - for standard output (default: -)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes for ranges longer than --chunk-years")
+    parser.add_argument("--chunk-years", type=int, default=CHUNK_YEARS,
+                        help=f"years per worker process (default: {CHUNK_YEARS})")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="time hot paths and write histograms to FILE "
+                             "(JSON if it ends in .json, else Prometheus text)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log progress to stderr")
+    args = parser.parse_args(argv)
+    if args.end is None:
+        args.end = args.start
+    first, last = TABLE_YEARS
+    if not first <= args.start <= last or not first <= args.end <= last:
+        parser.error(f"years must be between {first} and {last}")
+    if args.end < args.start:
+        parser.error("end year must not be before start year")
+    if args.chunk_years < 1:
+        parser.error("--chunk-years must be at least 1")
+    return args
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """ Command line entry point. """
+    args = parse_args(argv)
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s',
+                        level=logging.INFO if args.verbose else logging.WARNING)
+    db_setup()
+    if args.metrics:
+        metrics.enable()
+    try:
+        if args.output == "-":
+            # ICS needs its CRLF line endings written untranslated
+            sys.stdout.reconfigure(newline='')
+            try:
+                write_export(sys.stdout, args.format, (args.start, args.end),
+                             args.workers, args.chunk_years)
+                sys.stdout.flush()
+            except BrokenPipeError:
+                # The reader went away (e.g. piped into head); stop quietly
+                os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+                return 1
+        else:
+            with open(args.output, 'w', encoding="utf-8", newline='') as output:
+                write_export(output, args.format, (args.start, args.end),
+                             args.workers, args.chunk_years)
+            logging.info("Wrote %s holidays for %d-%d to %s", args.format, args.start,
+                         args.end, args.output)
+    finally:
+        database.close()
+    if args.metrics:
+        metrics.write(args.metrics)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,257 @@
+""" Pluggable sources of USNO-shaped astronomical data, chained with fallback and metrics. """
+import abc
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional
+import astronomy
+
+# Base URL of the USNO astronomical API
+API_BASE = "https://aa.usno.navy.mil/api"
+# The API returns at most this many moon phases per request
+USNO_MAX_PHASES = 99
+
+class SourceUnavailable(Exception):
+    """ A source cannot answer this request, e.g. a cache miss. Try the next source. """
+
+class SourceError(SourceUnavailable):
+    """ A source failed while answering, e.g. a network error or a malformed response. """
+
+def seasons_url(year: int, tz: int, dst: bool, base: Optional[str] = None) -> str:
+    """ API URL for a year's equinoxes and solstices. """
+    return f"{base or API_BASE}/seasons?year={year}&tz={tz}&dst={str(dst).lower()}"
+
+def moon_phases_url(start: datetime.date, nump: int, base: Optional[str] = None) -> str:
+    """ API URL for the moon phases following a date. """
+    return f"{base or API_BASE}/moon/phases/date?date={start.isoformat()}&nump={nump}"
+
+def fixture_path(directory: str, kind: str, key: str) -> str:
+    """ File holding one recorded response, e.g. kind 'seasons' and key '2025_tz-6_dst1'. """
+    return os.path.join(directory, f"{kind}_{key}.json")
+
+def seasons_key(year: int, tz: int, dst: bool) -> str:
+    """ Fixture key of a seasons request. """
+    return f"{year}_tz{tz}_dst{int(dst)}"
+
+def moon_phases_key(start: datetime.date, nump: int) -> str:
+    """ Fixture key of a moon phases request. """
+    return f"{start.isoformat()}_n{nump}"
+
+@dataclass
+class SourceStats():
+    """ Request counters and latency of one source. """
+    requests: int = 0
+    hits: int = 0
+    misses: int = 0
+    errors: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+class DataSource(abc.ABC):
+    """ Provides seasons and moon phases JSON in the USNO response format, with statistics. """
+    name = "source"
+
+    def __init__(self):
+        self.stats = SourceStats()
+        self.lock = threading.Lock()
+
+    @abc.abstractmethod
+    def fetch_seasons(self, year: int, tz: int, dst: bool) -> dict:
+        """ Seasons response, or raise SourceUnavailable. """
+
+    @abc.abstractmethod
+    def fetch_moon_phases(self, start: datetime.date, nump: int) -> dict:
+        """ Moon phases response, or raise SourceUnavailable. """
+
+    def _measure(self, fetch: Callable[[], dict]) -> dict:
+        """ Run a fetch, counting its outcome and latency. """
+        started = time.perf_counter()
+        outcome = "hits"
+        try:
+            return fetch()
+        except SourceError:
+            outcome = "errors"
+            raise
+        except SourceUnavailable:
+            outcome = "misses"
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.stats.requests += 1
+                setattr(self.stats, outcome, getattr(self.stats, outcome) + 1)
+                self.stats.total_seconds += elapsed
+                self.stats.max_seconds = max(self.stats.max_seconds, elapsed)
+
+    def seasons(self, year: int, tz: int, dst: bool) -> dict:
+        """ A year's equinoxes, solstices and apsides, in local time tz (hours from UT) with
+        optional US DST; callers pass calculate_dates.TIMEZONE and DST. """
+        return self._measure(lambda: self.fetch_seasons(year, tz, dst))
+
+    def moon_phases(self, start: datetime.date, nump: int) -> dict:
+        """ The nump primary moon phases following a date, in UT. """
+        return self._measure(lambda: self.fetch_moon_phases(start, nump))
+
+    def report(self) -> Dict[str, dict]:
+        """ Statistics by source name. """
+        with self.lock:
+            return {self.name: asdict(self.stats)}
+
+class LocalSource(DataSource):
+    """ The built-in astronomical engine. """
+    name = "local"
+
+    def fetch_seasons(self, year: int, tz: int, dst: bool) -> dict:
+        return astronomy.seasons(year, tz=tz, dst=dst)
+
+    def fetch_moon_phases(self, start: datetime.date, nump: int) -> dict:
+        return astronomy.moon_phases(start, nump)
+
+class USNOSource(DataSource):
+    """ The live USNO API, through an HTTP response cache with revalidation. """
+    name = "usno"
+
+    def __init__(self, response_cache: Callable, base: Optional[str] = None):
+        super().__init__()
+        # A callable returning the ResponseCache, so nothing is opened until first use
+        self.response_cache = response_cache
+        self.base = base
+
+    def _get(self, url: str, field: str) -> dict:
+        """ GET a URL, raising SourceError unless the response holds the expected field. """
+        import urllib3 # pylint: disable=import-outside-toplevel
+        try:
+            response = self.response_cache().get_json(url)
+        except (urllib3.exceptions.HTTPError, OSError, ValueError) as request_error:
+            raise SourceError(f"{url}: {request_error}") from request_error
+        if not isinstance(response, dict) or field not in response:
+            raise SourceError(f"{url}: unexpected response {str(response)[:200]}")
+        return response
+
+    def fetch_seasons(self, year: int, tz: int, dst: bool) -> dict:
+        return self._get(seasons_url(year, tz, dst, self.base), "data")
+
+    def fetch_moon_phases(self, start: datetime.date, nump: int) -> dict:
+        if nump > USNO_MAX_PHASES:
+            raise SourceUnavailable(f"USNO serves at most {USNO_MAX_PHASES} phases per request")
+        return self._get(moon_phases_url(start, nump, self.base), "phasedata")
+
+class CacheSource(DataSource):
+    """ Responses already stored in the HTTP response cache, never touching the network.
+    Only responses within the cache TTL are served unless fresh_only is False, so stale ones
+    still go to the API for revalidation. """
+    name = "cache"
+
+    def __init__(self, response_cache: Callable, base: Optional[str] = None,
+                 fresh_only: bool = True):
+        super().__init__()
+        self.response_cache = response_cache
+        self.base = base
+        self.fresh_only = fresh_only
+        if not fresh_only:
+            self.name = "stale-cache"
+
+    def _peek(self, url: str) -> dict:
+        """ A stored response, or raise SourceUnavailable. """
+        response = self.response_cache().peek_json(url, self.fresh_only)
+        if response is None:
+            raise SourceUnavailable(f"{url} not cached" if not self.fresh_only
+                                    else f"{url} not cached or stale")
+        return response
+
+    def fetch_seasons(self, year: int, tz: int, dst: bool) -> dict:
+        return self._peek(seasons_url(year, tz, dst, self.base))
+
+    def fetch_moon_phases(self, start: datetime.date, nump: int) -> dict:
+        return self._peek(moon_phases_url(start, nump, self.base))
+
+class ReplaySource(DataSource):
+    """ Responses recorded as JSON files; with an upstream source, records whatever is missing. """
+    name = "replay"
+
+    def __init__(self, directory: str, upstream: Optional[DataSource] = None):
+        super().__init__()
+        self.directory = directory
+        self.upstream = upstream
+
+    def _replay(self, path: str, fetch: Callable[[], dict]) -> dict:
+        """ Read a recording, or record it from upstream. """
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as recording:
+                return json.load(recording)
+        if self.upstream is None:
+            raise SourceUnavailable(f"No recording {path}")
+        response = fetch()
+        os.makedirs(self.directory, exist_ok=True)
+        with open(path, 'w', encoding="utf-8") as recording:
+            json.dump(response, recording)
+        return response
+
+    def fetch_seasons(self, year: int, tz: int, dst: bool) -> dict:
+        return self._replay(fixture_path(self.directory, "seasons", seasons_key(year, tz, dst)),
+                            lambda: self.upstream.seasons(year, tz, dst))
+
+    def fetch_moon_phases(self, start: datetime.date, nump: int) -> dict:
+        return self._replay(fixture_path(self.directory, "moon", moon_phases_key(start, nump)),
+                            lambda: self.upstream.moon_phases(start, nump))
+
+class SourceChain(DataSource):
+    """ Try sources in order, skipping any that keeps failing until a cooldown has passed. """
+    name = "chain"
+
+    def __init__(self, sources: List[DataSource], failure_limit: int = 3,
+                 cooldown: float = 60.0):
+        super().__init__()
+        self.sources = sources
+        self.failure_limit = failure_limit
+        self.cooldown = cooldown
+        self.failures: Dict[str, int] = {}
+        self.skip_until: Dict[str, float] = {}
+
+    def _first(self, fetch: Callable[[DataSource], dict]) -> dict:
+        """ The first answer from a source that is up. """
+        problems = []
+        for source in self.sources:
+            if time.monotonic() < self.skip_until.get(source.name, 0.0):
+                problems.append(f"{source.name}: cooling down")
+                continue
+            try:
+                response = fetch(source)
+            except SourceError as source_error:
+                problems.append(f"{source.name}: {source_error}")
+                self._failed(source)
+                continue
+            except SourceUnavailable as unavailable:
+                problems.append(f"{source.name}: {unavailable}")
+                continue
+            with self.lock:
+                self.failures[source.name] = 0
+            return response
+        raise SourceUnavailable("; ".join(problems))
+
+    def _failed(self, source: DataSource):
+        """ Count a failure, benching the source once it fails too often in a row. """
+        with self.lock:
+            self.failures[source.name] = self.failures.get(source.name, 0) + 1
+            if self.failures[source.name] >= self.failure_limit:
+                logging.warning("Data source %s failed %d times, skipping it for %.0f s",
+                                source.name, self.failures[source.name], self.cooldown)
+                self.skip_until[source.name] = time.monotonic() + self.cooldown
+                self.failures[source.name] = 0
+
+    def fetch_seasons(self, year: int, tz: int, dst: bool) -> dict:
+        return self._first(lambda source: source.seasons(year, tz, dst))
+
+    def fetch_moon_phases(self, start: datetime.date, nump: int) -> dict:
+        return self._first(lambda source: source.moon_phases(start, nump))
+
+    def report(self) -> Dict[str, dict]:
+        """ Statistics of the chain and of each source in it. """
+        report = super().report()
+        for source in self.sources:
+            report.update(source.report())
+        return report
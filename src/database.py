@@ -0,0 +1,221 @@
+""" Data access layer for the holiday database. """
+import logging
+import sqlite3
+import threading
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from metrics import timed
+
+DB_PATH = 'norse_calendar.db'
+
+# Same shape as a 'holidays' row without its id and year
+HolidayRow = Tuple[str, str, Optional[str], Optional[str], Optional[str]]
+
+# Every query is scoped to a fingerprint of the rules and settings the holidays were
+# calculated with, so holidays for another time zone or engine version are never read
+SELECT_STORED_YEARS = 'SELECT year FROM years WHERE fingerprint = ? AND year BETWEEN ? AND ?'
+SELECT_HOLIDAYS = '''
+    SELECT name, start_date, end_date, description, schedule FROM holidays
+    WHERE fingerprint = ? AND year = ? ORDER BY id
+'''
+SELECT_HOLIDAYS_RANGE = '''
+    SELECT name, start_date, end_date, description, schedule FROM holidays
+    WHERE fingerprint = ? AND year BETWEEN ? AND ? ORDER BY year, id
+'''
+INSERT_HOLIDAY = '''
+    INSERT OR IGNORE INTO holidays
+        (name, start_date, end_date, description, schedule, year, fingerprint)
+    VALUES (?, ?, ?, ?, ?, CAST(substr(?, 1, 4) AS INTEGER), ?)
+'''
+INSERT_YEAR = 'INSERT OR IGNORE INTO years (year, fingerprint) VALUES (?, ?)'
+
+class Database():
+    """ One long-lived, tuned SQLite connection per thread for a configurable path. """
+    def __init__(self, path: str = DB_PATH):
+        self.path = path
+        self.local = threading.local()
+        # Every open connection, so close() can reach those of other threads too
+        self.lock = threading.Lock()
+        self.connections: Set[sqlite3.Connection] = set()
+        # Bumped by close(), so threads reopen instead of using a closed connection
+        self.generation = 0
+
+    def configure(self, path: str):
+        """ Point every thread at a different database file from its next query on. """
+        self.path = path
+
+    def connection(self) -> sqlite3.Connection:
+        """ Return this thread's connection, opening it on first use. """
+        conn = getattr(self.local, "conn", None)
+        if conn is not None and self.local.path == self.path \
+                and self.local.generation == self.generation:
+            return conn
+        if conn is not None:
+            with self.lock:
+                self.connections.discard(conn)
+            conn.close()
+        logging.info("Opening database %s", self.path)
+        # Only this thread queries it; close() may close it from another
+        conn = sqlite3.connect(self.path, timeout=30, cached_statements=256,
+                               check_same_thread=False)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        conn.execute('PRAGMA cache_size = -16000')
+        with self.lock:
+            self.connections.add(conn)
+            self.local.generation = self.generation
+        self.local.conn = conn
+        self.local.path = self.path
+        return conn
+
+    def close(self):
+        """ Close every thread's connection, e.g. at shutdown. """
+        with self.lock:
+            connections, self.connections = self.connections, set()
+            self.generation += 1
+        for conn in connections:
+            conn.close()
+        if connections:
+            logging.info("Closed %d database connections", len(connections))
+
+    @timed("db.stored_years")
+    def stored_years(self, start: int, end: int, fingerprint: bytes) -> Set[int]:
+        """ Years from start to end whose holidays are already in the DB. """
+        return {row[0] for row in self.connection().execute(SELECT_STORED_YEARS,
+                                                            (fingerprint, start, end))}
+
+    @timed("db.read_holidays")
+    def read_holidays(self, year: int, fingerprint: bytes) -> List[HolidayRow]:
+        """ Holidays starting in a year, in the order they were written. """
+        return self.connection().execute(SELECT_HOLIDAYS, (fingerprint, year)).fetchall()
+
+    def iter_holidays(self, start: int, end: int, fingerprint: bytes) -> Iterator[HolidayRow]:
+        """ Stream holidays starting from start to end with one indexed query. """
+        yield from self.connection().execute(SELECT_HOLIDAYS_RANGE, (fingerprint, start, end))
+
+    @timed("db.write_holidays")
+    def write_holidays(self, rows_by_year: Dict[int, List[HolidayRow]], fingerprint: bytes):
+        """ Write whole years of holidays and mark them stored, in a single transaction. """
+        conn = self.connection()
+        with conn:
+            conn.executemany(INSERT_HOLIDAY, ((*row, row[1], fingerprint)
+                                              for rows in rows_by_year.values()
+                                              for row in rows))
+            conn.executemany(INSERT_YEAR, ((year, fingerprint) for year in rows_by_year))
+
+# Shared data access object used by the whole application
+database = Database()
+
+def db_setup():
+    """ Set up the SQLite database for storing holidays. """
+    conn = database.connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS holidays (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            start_date TEXT,
+            end_date TEXT,
+            description TEXT,
+            schedule TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS years (
+            id INTEGER PRIMARY KEY,
+            year INTEGER
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS moon_phases (
+            id INTEGER PRIMARY KEY,
+            phase TEXT,
+            date TEXT
+        )
+    ''')
+    conn.commit()
+    migrate_db(conn)
+    logging.info("Database setup complete.")
+
+def migrate_to_v1(cursor: sqlite3.Cursor):
+    """ Add a year column, indexes and unique constraints, dropping duplicate rows. """
+    cursor.execute('''
+        CREATE TABLE holidays_v1 (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            start_date TEXT,
+            end_date TEXT,
+            description TEXT,
+            schedule TEXT,
+            year INTEGER,
+            UNIQUE (name, start_date)
+        )
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO holidays_v1
+            (id, name, start_date, end_date, description, schedule, year)
+        SELECT id, name, start_date, end_date, description, schedule,
+               CAST(substr(start_date, 1, 4) AS INTEGER)
+        FROM holidays ORDER BY id
+    ''')
+    cursor.execute('''
+        CREATE TABLE years_v1 (
+            id INTEGER PRIMARY KEY,
+            year INTEGER UNIQUE
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO years_v1 (year) SELECT year FROM years ORDER BY id')
+    cursor.execute('DROP TABLE holidays')
+    cursor.execute('DROP TABLE years')
+    cursor.execute('ALTER TABLE holidays_v1 RENAME TO holidays')
+    cursor.execute('ALTER TABLE years_v1 RENAME TO years')
+    cursor.execute('CREATE INDEX idx_holidays_year ON holidays (year)')
+    cursor.execute('CREATE INDEX idx_holidays_start_date ON holidays (start_date)')
+
+def migrate_to_v2(cursor: sqlite3.Cursor):
+    """ Key stored holidays by the fingerprint of the rules and settings they were calculated
+    with. Existing rows carry no fingerprint, so they are dropped and recalculated on demand. """
+    cursor.execute('DROP TABLE holidays')
+    cursor.execute('DROP TABLE years')
+    cursor.execute('''
+        CREATE TABLE holidays (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            start_date TEXT,
+            end_date TEXT,
+            description TEXT,
+            schedule TEXT,
+            year INTEGER,
+            fingerprint BLOB,
+            UNIQUE (fingerprint, name, start_date)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE years (
+            id INTEGER PRIMARY KEY,
+            year INTEGER,
+            fingerprint BLOB,
+            UNIQUE (fingerprint, year)
+        )
+    ''')
+    cursor.execute('CREATE INDEX idx_holidays_fingerprint_year ON holidays (fingerprint, year)')
+    cursor.execute('CREATE INDEX idx_holidays_start_date ON holidays (start_date)')
+
+# Each migration upgrades the schema by one version, starting from the original tables
+MIGRATIONS = [migrate_to_v1, migrate_to_v2]
+
+def migrate_db(conn: sqlite3.Connection):
+    """ Upgrade an existing database in place to the latest schema version. """
+    cursor = conn.cursor()
+    version = cursor.execute('PRAGMA user_version').fetchone()[0]
+    for target, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        logging.info("Migrating database to schema version %d.", target)
+        cursor.execute('BEGIN')
+        try:
+            migration(cursor)
+            cursor.execute(f'PRAGMA user_version = {target}')
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            logging.exception("Database migration to version %d failed.", target)
+            raise
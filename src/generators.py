@@ -1,37 +1,83 @@
 """
 Generate Outputs
 """
+import csv
+import dataclasses
+import io
+import json
 import logging
-from typing import List
-import datetime
-import tkinter as tk
-from tkinter import messagebox, filedialog, ttk
-from ics import Calendar, Event
-from calculate_dates import Holiday, get_holidays
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, Optional
+from calculate_dates import Holiday, get_holidays_range
+from ics_writer import CALENDAR_FOOTER, CALENDAR_HEADER, event_text, format_stamp, write_calendar
+from metrics import span, timed
 
-def generate_summary(holidays: List[Holiday]) -> str:
-    """ Generate Holiday summary string. """
-    logging.info("Generating Holiday Summary")
-    summary = ""
+CSV_HEADER = ("Name", "Start", "End", "Description", "Schedule")
+
+def iter_summary(holidays: Iterable[Holiday]) -> Iterator[str]:
+    """ Generate the Holiday summary one holiday at a time. """
     for holiday in holidays:
-        value = f"Name: {holiday.name}\n"
+        yield f"Name: {holiday.name}\n"
         if holiday.start_date is None:
             logging.error("Date Missing!")
-            value += "Date: Missing\n"
+            yield "Date: Missing\n"
         elif holiday.end_date is None:
-            value += f"Date: {holiday.start_date}\n"
+            yield f"Date: {holiday.start_date}\n"
         else:
-            value += f"Start Date: {holiday.start_date}\n"
-            value += f"End Date: {holiday.end_date}\n"
+            yield f"Start Date: {holiday.start_date}\nEnd Date: {holiday.end_date}\n"
         if holiday.description is not None:
-            value += f"Description: {holiday.description}\n"
+            yield f"Description: {holiday.description}\n"
         if holiday.schedule is not None:
-            value += f"Schedule: {holiday.schedule}\n"
-        summary += value
-    return summary
+            yield f"Schedule: {holiday.schedule}\n"
+
+@timed("generate_summary")
+def generate_summary(holidays: Iterable[Holiday]) -> str:
+    """ Generate Holiday summary string. """
+    logging.info("Generating Holiday Summary")
+    return "".join(iter_summary(holidays))
 
-def export_summary(summary: tk.Text,):
-    """ Export Summary File """
+@dataclass(frozen=True)
+class ExportFormat():
+    """ How to write holidays in a file format, one holiday at a time. """
+    header: str
+    separator: str
+    footer: str
+    # Text of one holiday, given the DTSTAMP of the export
+    item: Callable[[Holiday, str], str]
+
+def csv_line(holiday: Holiday, _stamp: str = "") -> str:
+    """ One CSV record of a holiday. """
+    line = io.StringIO()
+    csv.writer(line).writerow([getattr(holiday, field.name) or ""
+                               for field in dataclasses.fields(holiday)])
+    return line.getvalue()
+
+def json_object(holiday: Holiday, _stamp: str = "") -> str:
+    """ One holiday as a JSON object. """
+    return json.dumps(dataclasses.asdict(holiday), ensure_ascii=False)
+
+EXPORT_FORMATS: Dict[str, ExportFormat] = {
+    "ics": ExportFormat(CALENDAR_HEADER, "", CALENDAR_FOOTER, event_text),
+    "json": ExportFormat("[\n", ",\n", "\n]\n", json_object),
+    "csv": ExportFormat(csv_line(Holiday(*CSV_HEADER)), "", "", csv_line),
+    "summary": ExportFormat("", "", "", lambda holiday, stamp: "".join(iter_summary((holiday,)))),
+}
+
+def iter_export(export_format: str, holidays: Iterable[Holiday],
+                stamp: Optional[str] = None) -> Iterator[str]:
+    """ Stream holidays in one of EXPORT_FORMATS. """
+    export = EXPORT_FORMATS[export_format]
+    stamp = stamp or format_stamp()
+    yield export.header
+    for index, holiday in enumerate(holidays):
+        if index:
+            yield export.separator
+        yield export.item(holiday, stamp)
+    yield export.footer
+
+def export_summary(start_year: int, end_year: int):
+    """ Export Summary File from the cached holidays of the loaded years """
+    from tkinter import messagebox, filedialog # pylint: disable=import-outside-toplevel
     logging.info("Exporting Summary File")
     filename = filedialog.asksaveasfilename(
         title='Save as...',
@@ -39,38 +85,28 @@ def export_summary(summary: tk.Text,):
         defaultextension='.txt'
     )
     try:
-        with open(filename, 'w', encoding="utf-8") as norse_calendar:
-            norse_calendar.write(summary.get(1.0, tk.END))
+        with open(filename, 'w', encoding="utf-8") as norse_calendar, span("export_summary"):
+            norse_calendar.writelines(iter_summary(
+                get_holidays_range(start_year, end_year)))
             logging.info("Summary File Created")
         messagebox.showinfo("Summary Created", "Summary Export Created")
     except FileNotFoundError as e:
         logging.warning(str(e))
 
-def generate_ics(start_year_selector: ttk.Combobox, end_year_selector: ttk.Combobox):
-    """ Generate ICS file for Calendar Import """
+def generate_ics(start_year: int, end_year: int):
+    """ Generate ICS file for Calendar Import of the loaded years """
+    from tkinter import messagebox, filedialog # pylint: disable=import-outside-toplevel
     logging.info("Generating ICS File")
     filename = filedialog.asksaveasfilename(
         title='Save as...',
         filetypes=[('Calendar files', '*.ics')],
         defaultextension='.ics'
     )
-    holidays = []
-    for year in range(int(start_year_selector.get()), int(end_year_selector.get()) + 1):
-        holidays.extend(get_holidays(year))
-    calendar = Calendar()
-    for holiday in holidays:
-        event = Event()
-        event.name = holiday.name
-        event.begin = datetime.datetime.strptime(holiday.start_date, '%Y-%m-%d')
-        event.description = f"Description: {holiday.description}\nSchedule: {holiday.schedule}"
-        if holiday.end_date is not None:
-            event.end = datetime.datetime.strptime(holiday.end_date, '%Y-%m-%d')
-        event.make_all_day()
-        calendar.events.add(event)
-        print("Added event to calendar:", holiday.name)
     try:
-        with open(filename, 'w', encoding="utf-8") as norse_calendar:
-            norse_calendar.writelines(calendar.serialize_iter())
+        with (open(filename, 'w', encoding="utf-8", newline='') as norse_calendar,
+              span("generate_ics")):
+            write_calendar(norse_calendar,
+                           get_holidays_range(start_year, end_year))
             logging.info("ICS File Created")
         messagebox.showinfo("ICS Created", "ICS File Created")
     except FileNotFoundError as e:
@@ -0,0 +1,68 @@
+""" Process-wide, size-bounded LRU cache of per-year holiday results. """
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+# Enough for every year the UI offers, with room for the spillover year on each side
+DEFAULT_MAXSIZE = 512
+
+class HolidayCache():
+    """ LRU cache of immutable per-year results, keyed by (rule set, year), with statistics. """
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key: Tuple[Hashable, int]) -> bool:
+        with self.lock:
+            return key in self.entries
+
+    def lookup(self, key: Tuple[Hashable, int]) -> Optional[tuple]:
+        """ Return a cached result, or None, counting the hit or miss. """
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def store(self, key: Tuple[Hashable, int], value: Iterable) -> tuple:
+        """ Cache a result as a tuple, evicting the least recently used entries. """
+        value = tuple(value)
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return value
+
+    def get(self, key: Tuple[Hashable, int], load: Callable[[], Iterable]) -> tuple:
+        """ Return a cached result, loading and caching it on a miss. """
+        value = self.lookup(key)
+        if value is None:
+            value = self.store(key, load())
+        return value
+
+    def invalidate(self, years: Optional[Iterable[int]] = None) -> None:
+        """ Drop cached results for some years under every rule set, or everything. """
+        with self.lock:
+            if years is None:
+                self.entries.clear()
+            else:
+                years = set(years)
+                for key in [key for key in self.entries if key[1] in years]:
+                    del self.entries[key]
+        logging.info("Holiday cache invalidated for %s.",
+                     "all years" if years is None else f"{len(years)} years")
+
+    def stats(self) -> Dict[str, int]:
+        """ Hit, miss and size counters. """
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "size": len(self.entries), "maxsize": self.maxsize}
+
+holiday_cache = HolidayCache()
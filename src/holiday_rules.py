@@ -0,0 +1,346 @@
+""" Declarative Norse holiday rules and the dependency graph that evaluates them. """
+# pylint: disable=line-too-long
+import bisect
+import datetime
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Astronomical inputs every rule set may anchor on, supplied per year
+INPUTS = ("March Equinox", "June Solstice", "September Equinox", "December Solstice",
+          "Previous December Solstice")
+
+MOON_STEPS = ("next_new_moon", "next_full_moon", "previous_full_moon", "closest_full_moon")
+
+# Start and end dates for each occurrence of a rule
+Occurrence = Tuple[datetime.datetime, Optional[datetime.datetime]]
+
+class MoonIndex():
+    """ Sorted per-phase moon dates with bisect-based next/previous/closest queries. """
+    def __init__(self, all_moons: list):
+        self.new_moons = sorted(moon.date for moon in all_moons if moon.phase == "New Moon")
+        self.full_moons = sorted(moon.date for moon in all_moons if moon.phase == "Full Moon")
+
+    @staticmethod
+    def _after(dates: List[datetime.datetime], input_date: datetime.datetime) -> datetime.datetime:
+        """ First date strictly after input_date. """
+        index = bisect.bisect_right(dates, input_date)
+        if index == len(dates):
+            raise ValueError(f"No moon phase data after {input_date}")
+        return dates[index]
+
+    @staticmethod
+    def _before(dates: List[datetime.datetime], input_date: datetime.datetime) -> datetime.datetime:
+        """ Last date strictly before input_date. """
+        index = bisect.bisect_left(dates, input_date)
+        if index == 0:
+            raise ValueError(f"No moon phase data before {input_date}")
+        return dates[index - 1]
+
+    def next_new_moon(self, input_date: datetime.datetime) -> datetime.datetime:
+        """ Get Next New Moon Date."""
+        return self._after(self.new_moons, input_date)
+
+    def next_full_moon(self, input_date: datetime.datetime) -> datetime.datetime:
+        """ Get Next Full Moon Date."""
+        return self._after(self.full_moons, input_date)
+
+    def previous_full_moon(self, input_date: datetime.datetime) -> datetime.datetime:
+        """ Get Previous Full Moon Date."""
+        return self._before(self.full_moons, input_date)
+
+    def closest_full_moon(self, input_date: datetime.datetime) -> datetime.datetime:
+        """ Get Closest Full Moon Date. """
+        previous = self.previous_full_moon(input_date)
+        following = self.next_full_moon(input_date)
+        if input_date - previous < following - input_date:
+            return previous
+        return following
+
+@dataclass(frozen=True)
+class DateSpec():
+    """
+    How to derive a date.
+
+    Either a fixed month/day in the evaluated year, or an anchor (an input or
+    another rule's start date), optionally moved halfway towards a second
+    anchor, then through moon steps in order, back to the given weekday and
+    finally offset by a number of days.
+    """
+    anchor: Optional[str] = None
+    midpoint: Optional[str] = None
+    moons: Tuple[str, ...] = ()
+    weekday: Optional[int] = None
+    days: int = 0
+    month_day: Optional[Tuple[int, int]] = None
+
+    def dependencies(self) -> Set[str]:
+        """ Names this date is derived from. """
+        return {name for name in (self.anchor, self.midpoint) if name is not None}
+
+    def resolve(self, year: int, values: Dict[str, datetime.datetime],
+                moons: MoonIndex) -> datetime.datetime:
+        """ Evaluate this date for a year from already resolved anchors. """
+        if self.month_day is not None:
+            return datetime.datetime(year, *self.month_day)
+        date = values[self.anchor]
+        if self.midpoint is not None:
+            date = date + (values[self.midpoint] - date) / 2
+        for step in self.moons:
+            date = getattr(moons, step)(date)
+        if self.weekday is not None:
+            date -= datetime.timedelta(days=(date.weekday() - self.weekday) % 7)
+        return date + datetime.timedelta(days=self.days)
+
+@dataclass(frozen=True)
+class HolidayRule():
+    """ A holiday defined as data: start and optional end, repeated every step_days. """
+    name: str
+    start: DateSpec
+    end: Optional[DateSpec] = None
+    description: Optional[str] = None
+    schedule: Optional[str] = None
+    repeat: int = 1
+    step_days: int = 0
+
+    def dependencies(self) -> Set[str]:
+        """ Names this rule is derived from. """
+        return self.start.dependencies() | (self.end.dependencies() if self.end else set())
+
+    def occurrences(self, year: int, values: Dict[str, datetime.datetime],
+                    moons: MoonIndex) -> List[Occurrence]:
+        """ Evaluate every occurrence of this rule for a year. """
+        start = self.start.resolve(year, values, moons)
+        end = self.end.resolve(year, values, moons) if self.end else None
+        return [(start + datetime.timedelta(days=self.step_days * each), end)
+                for each in range(self.repeat)]
+
+class RuleGraph():
+    """ A rule set compiled into a dependency graph and evaluated in topological order. """
+    def __init__(self, rules: Iterable[HolidayRule], inputs: Iterable[str] = INPUTS):
+        self.inputs = tuple(inputs)
+        self.rules: Dict[str, HolidayRule] = {}
+        for rule in rules:
+            if rule.name in self.rules or rule.name in self.inputs:
+                raise ValueError(f"Duplicate holiday rule: {rule.name}")
+            self.rules[rule.name] = rule
+        self.dependents: Dict[str, Set[str]] = {name: set() for name in self.inputs}
+        self.dependents.update({name: set() for name in self.rules})
+        for rule in self.rules.values():
+            for dependency in rule.dependencies():
+                if dependency not in self.dependents:
+                    raise ValueError(f"Holiday rule {rule.name} depends on unknown {dependency}")
+                self.dependents[dependency].add(rule.name)
+            for step in rule.start.moons + (rule.end.moons if rule.end else ()):
+                if step not in MOON_STEPS:
+                    raise ValueError(f"Holiday rule {rule.name} uses unknown moon step {step}")
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        """ Order rules so every rule follows the rules it depends on. """
+        pending = {name: len(rule.dependencies() - set(self.inputs))
+                   for name, rule in self.rules.items()}
+        ready = deque(name for name, count in pending.items() if count == 0)
+        order = []
+        while ready:
+            name = ready.popleft()
+            order.append(name)
+            for dependent in sorted(self.dependents[name]):
+                pending[dependent] -= 1
+                if pending[dependent] == 0:
+                    ready.append(dependent)
+        if len(order) != len(self.rules):
+            cyclic = sorted(set(self.rules) - set(order))
+            raise ValueError(f"Holiday rules form a cycle: {', '.join(cyclic)}")
+        return order
+
+    def affected(self, changed: Iterable[str]) -> List[str]:
+        """ Rules that must be recomputed when the given inputs or rules change, in order. """
+        # Read twice below, so an iterator must not be consumed by the first pass
+        changed = list(changed)
+        seen: Set[str] = set()
+        queue = deque(changed)
+        while queue:
+            for dependent in self.dependents[queue.popleft()]:
+                if dependent not in seen:
+                    seen.add(dependent)
+                    queue.append(dependent)
+        seen.update(name for name in changed if name in self.rules)
+        return [name for name in self.order if name in seen]
+
+    def evaluate(self, year: int, inputs: Dict[str, datetime.datetime], moons: MoonIndex,
+                 previous: Optional[Dict[str, List[Occurrence]]] = None,
+                 changed: Optional[Iterable[str]] = None) -> Dict[str, List[Occurrence]]:
+        """
+        Evaluate the rules for one year.
+
+        Given the previous result and the names of the inputs that changed,
+        only the rules downstream of those inputs are recomputed.
+        """
+        if previous is None or changed is None:
+            results: Dict[str, List[Occurrence]] = {}
+            names = self.order
+        else:
+            results = dict(previous)
+            names = self.affected(changed)
+        values = dict(inputs)
+        values.update({name: occurrences[0][0] for name, occurrences in results.items()})
+        for name in names:
+            results[name] = self.rules[name].occurrences(year, values, moons)
+            values[name] = results[name][0][0]
+        return results
+
+    def evaluate_years(self, inputs_by_year: Dict[int, Dict[str, datetime.datetime]],
+                       moons: MoonIndex) -> Dict[int, Dict[str, List[Occurrence]]]:
+        """ Evaluate the rules for every year in inputs_by_year against one moon index. """
+        return {year: self.evaluate(year, inputs, moons)
+                for year, inputs in inputs_by_year.items()}
+
+NORSE_RULES = (
+    HolidayRule("Spring Equinox", DateSpec("March Equinox")),
+    HolidayRule("Summer Solstice", DateSpec("June Solstice")),
+    HolidayRule("Fall Equinox", DateSpec("September Equinox")),
+    HolidayRule("Winter Solstice", DateSpec("December Solstice")),
+    HolidayRule(
+        "Yule",
+        DateSpec("Winter Solstice"),
+        DateSpec("Winter Solstice", days=12),
+        "12 day celebration, each day celebrating a different God/Goddess/community/kin",
+        "Start: Winter Solstice, End: 12 days after the Winter Solstice."),
+    HolidayRule(
+        "Thorrablot",
+        DateSpec("Winter Solstice", moons=("next_new_moon", "next_full_moon")),
+        None,
+        "Welcoming Old man winter and Thor into the home to allow them to warm up after a cold winter",
+        "The full moon after the new moon following the Winter Solstice."),
+    HolidayRule(
+        "Disting",
+        DateSpec("Thorrablot", moons=("next_full_moon",)),
+        None,
+        "Celebration of Freya and the love in your life",
+        "The full moon after the Thorrablot."),
+    HolidayRule(
+        "Mid-Winter",
+        DateSpec("Thorrablot"),
+        DateSpec("Thorrablot", moons=("next_new_moon",)),
+        "Marks the year's longest night and the symbolic rebirth of the sun",
+        "Start: Thorrablot, End: Next New Moon"),
+    HolidayRule(
+        "Lenzen",
+        DateSpec("Spring Equinox", moons=("previous_full_moon",)),
+        DateSpec("Spring Equinox", moons=("next_full_moon",)),
+        "Comes in a perilous time in spring when food supplies that were stored for the winter were running low and new sources were not available yet, fasting during this time is used to honor those who suffered with hunger and famine",
+        "Start: Full moon before the Spring Equinox, End: Full moon after the Spring Equinox"),
+    HolidayRule(
+        "Offering to Freya",
+        DateSpec("Spring Equinox"),
+        None,
+        "Celebrates Freya's gift of fertility over the land and her hand in making spring come",
+        "The Spring Equinox"),
+    HolidayRule(
+        "Ostara",
+        DateSpec("Spring Equinox", moons=("next_full_moon",)),
+        None,
+        "A celebration of spring, making it through the winter. Celebrating Idunn, freya, Ostara",
+        "The full moon after the Spring Equinox."),
+    HolidayRule(
+        "Sigrblot",
+        DateSpec("Ostara", moons=("next_new_moon",)),
+        None,
+        "Marks the start of campaigning season where weather was getting warmer, Offering sacrifices for victories in battle",
+        "The new moon after Ostara."),
+    HolidayRule(
+        "Summer Nights Holy Tide",
+        DateSpec("Ostara"),
+        DateSpec("Sigrblot"),
+        "The spring festival that marked the beginning of the Norse year's summer season",
+        "Start: Ostara, End: Sigrblot"),
+    HolidayRule(
+        "Mid-Summer",
+        DateSpec("Summer Solstice"),
+        None,
+        "Marks the peak power of the sun goddess Sol (Sunna), celebrating the shortest night of the year",
+        "The Summer Solstice"),
+    HolidayRule(
+        "Lammas",
+        DateSpec("Fall Equinox", moons=("closest_full_moon",)),
+        None,
+        "Marks the start of the Harvest season (Gratitude for hard work leading to abundance)",
+        "The full moon closest to the Fall Equinox."),
+    HolidayRule(
+        "Hausblot",
+        DateSpec("Lammas", moons=("next_new_moon",)),
+        None,
+        "Celebration of giving thanks for the bountiful harvest and time to prepare for the coming winter",
+        "The new moon after Lammas."),
+    HolidayRule(
+        "Harvest Home Holy Tide",
+        DateSpec("Lammas"),
+        DateSpec("Hausblot"),
+        "Marks the end of the summer season, serving as the major harvest and community celebration",
+        "Start: Lammas, End: Hausblot"),
+    HolidayRule(
+        "Alfablot",
+        DateSpec("Fall Equinox", moons=("next_full_moon", "next_full_moon")),
+        None,
+        "Remembering the fallen male ancestors and offerings to honor the protective spirits of the land",
+        "The two full moons after the Fall Equinox."),
+    HolidayRule(
+        "Disablot",
+        DateSpec("Alfablot", moons=("next_new_moon",)),
+        None,
+        "Remembering the fallen female ancestors and offerings to honor the family protective spirits",
+        "The new moon after the Alfablot."),
+    HolidayRule(
+        "Winters Nights Holy Tide",
+        DateSpec("Alfablot"),
+        DateSpec("Disablot"),
+        "Starts a series of sacrifices celebrating love for friends and family and those who have fallen",
+        "Start: Alfablot, End: Disablot"),
+    HolidayRule(
+        "Welcome Goi and Freya",
+        DateSpec(month_day=(2, 1)),
+        None,
+        "Welcoming Goi and Freya into the home to warm up and thanking them for the spring time to come",
+        "February 1st"),
+    HolidayRule(
+        "Loki Day",
+        DateSpec(month_day=(4, 1)),
+        None,
+        "A day for pranks and tricks, made in honor of the trickster god",
+        "April 1st"),
+    HolidayRule(
+        "Lokabrenna",
+        DateSpec(month_day=(7, 13)),
+        None,
+        "Honoring Loki’s transformative fire, often involving rituals to 'burn away' stagnant energy or personal obstacles",
+        "July 13th"),
+    HolidayRule(
+        "Walpurgisnacht",
+        DateSpec(month_day=(4, 30)),
+        None,
+        "Marks the official end of winter and the beginning of spring",
+        "April 30th"),
+    HolidayRule(
+        "Mayday",
+        DateSpec(month_day=(5, 1)),
+        None,
+        "Celebrating the hope for triumph of our values: courageousness, solidarity, and generosity over selfishness and greed",
+        "May 1st"),
+    HolidayRule(
+        "Charming of the Plough",
+        DateSpec("Previous December Solstice", midpoint="Spring Equinox"),
+        None,
+        "The preparation for the start of the planting season",
+        "Halfway between previous Winter Solstice and Spring Equinox"),
+    HolidayRule(
+        "Sunwait",
+        DateSpec("Winter Solstice", weekday=3),
+        None,
+        "Each night celebrates the first 6 runes of Freya's Aett",
+        "Start: 6th Thursday before Winter Solstice, End: Thursday before Winter Solstice",
+        repeat=6,
+        step_days=-7),
+)
+
+NORSE_CALENDAR = RuleGraph(NORSE_RULES)
@@ -0,0 +1,144 @@
+""" Precomputed, memory-mapped holiday table shipped with the application. """
+import datetime
+import functools
+import hashlib
+import logging
+import mmap
+import os
+import struct
+from typing import Dict, Hashable, List, Optional, Tuple
+from holiday_rules import RuleGraph
+
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'holidays.bin')
+MAGIC = b'NORSECAL'
+FORMAT_VERSION = 1
+
+# magic, format version, first year, last year, record count, string count, rules fingerprint
+HEADER = struct.Struct('<8sHHHII32s')
+# start ordinal, end ordinal (0 if none), name, description and schedule string ids
+RECORD = struct.Struct('<iiHHH')
+OFFSET = struct.Struct('<I')
+NO_STRING = 0xFFFF
+
+# Same shape as a 'holidays' DB row without its id
+Row = Tuple[str, str, Optional[str], Optional[str], Optional[str]]
+
+@functools.lru_cache(maxsize=None)
+def rules_fingerprint(rules: RuleGraph, settings: Tuple[Hashable, ...] = ()) -> bytes:
+    """ Identify a rule set and the settings it was calculated with (time zone, engine
+    version), so a table built from other rules or settings is never used. """
+    text = repr((FORMAT_VERSION, rules.inputs, tuple(rules.rules.values()), settings))
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+def _date_ordinal(date) -> int:
+    """ Ordinal of a datetime, or 0 if missing. """
+    return date.toordinal() if date is not None else 0
+
+def write_table(path: str, holidays_by_year: Dict[int, list], fingerprint: bytes) -> None:
+    """ Write calculated holidays for consecutive years to a table file. """
+    # pylint: disable=too-many-locals
+    first_year, last_year = min(holidays_by_year), max(holidays_by_year)
+    strings: List[str] = []
+    string_ids: Dict[str, int] = {}
+
+    def string_id(value: Optional[str]) -> int:
+        """ Intern a string in the string table. """
+        if value is None:
+            return NO_STRING
+        if value not in string_ids:
+            string_ids[value] = len(strings)
+            strings.append(value)
+        return string_ids[value]
+
+    # Group by the year the holiday starts in, keeping calculation order within a year
+    records: Dict[int, List[bytes]] = {year: [] for year in range(first_year, last_year + 2)}
+    for year in range(first_year, last_year + 1):
+        for holiday in holidays_by_year[year] or []:
+            start_year = holiday.start_date.year
+            if start_year in records:
+                records[start_year].append(RECORD.pack(
+                    _date_ordinal(holiday.start_date),
+                    _date_ordinal(holiday.end_date),
+                    string_id(holiday.name),
+                    string_id(holiday.description),
+                    string_id(holiday.schedule)))
+    if len(strings) >= NO_STRING:
+        raise ValueError("Too many distinct strings for the holiday table")
+
+    index = [0]
+    for year in range(first_year, last_year + 2):
+        index.append(index[-1] + len(records[year]))
+    encoded = [value.encode("utf-8") for value in strings]
+    string_offsets = [0]
+    for value in encoded:
+        string_offsets.append(string_offsets[-1] + len(value))
+
+    with open(path, 'wb') as table:
+        table.write(HEADER.pack(MAGIC, FORMAT_VERSION, first_year, last_year,
+                                index[-1], len(strings), fingerprint))
+        table.writelines(OFFSET.pack(offset) for offset in index)
+        for year in range(first_year, last_year + 2):
+            table.writelines(records[year])
+        table.writelines(OFFSET.pack(offset) for offset in string_offsets)
+        table.writelines(encoded)
+    logging.info("Holiday table for years %d-%d written to %s.", first_year, last_year, path)
+
+class HolidayTable():
+    """ Read-only, memory-mapped view of a holiday table file. """
+    # pylint: disable=too-many-instance-attributes
+    def __init__(self, path: str = TABLE_PATH):
+        with open(path, 'rb') as table:
+            self.buffer = mmap.mmap(table.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.first_year, self.last_year, record_count, string_count,
+         self.fingerprint) = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} holiday table")
+        self.index_offset = HEADER.size
+        self.records_offset = (self.index_offset
+                               + OFFSET.size * (self.last_year - self.first_year + 3))
+        self.strings_offset = self.records_offset + RECORD.size * record_count
+        self.blob_offset = self.strings_offset + OFFSET.size * (string_count + 1)
+        self.strings: Dict[int, str] = {}
+
+    def matches(self, fingerprint: bytes) -> bool:
+        """ Whether the table was built from the rules and settings with this fingerprint. """
+        return self.fingerprint == fingerprint
+
+    def covers(self, year: int) -> bool:
+        """ Whether the table holds every holiday starting in a year. """
+        return self.first_year <= year <= self.last_year
+
+    def _string(self, string_id: int) -> Optional[str]:
+        """ Decode a string from the string table. """
+        if string_id == NO_STRING:
+            return None
+        if string_id not in self.strings:
+            start, end = struct.unpack_from('<II', self.buffer,
+                                            self.strings_offset + OFFSET.size * string_id)
+            self.strings[string_id] = self.buffer[self.blob_offset + start:
+                                                  self.blob_offset + end].decode("utf-8")
+        return self.strings[string_id]
+
+    def rows(self, year: int) -> List[Row]:
+        """ Holidays starting in a year, as (name, start, end, description, schedule). """
+        position = self.index_offset + OFFSET.size * (year - self.first_year)
+        first, last = struct.unpack_from('<II', self.buffer, position)
+        rows = []
+        for start, end, name, description, schedule in RECORD.iter_unpack(
+                self.buffer[self.records_offset + RECORD.size * first:
+                            self.records_offset + RECORD.size * last]):
+            rows.append((self._string(name),
+                         datetime.date.fromordinal(start).isoformat(),
+                         datetime.date.fromordinal(end).isoformat() if end else None,
+                         self._string(description),
+                         self._string(schedule)))
+        return rows
+
+@functools.lru_cache(maxsize=None)
+def load_table(path: str = TABLE_PATH) -> Optional[HolidayTable]:
+    """ Open the shipped holiday table once, or return None if it is unavailable. """
+    try:
+        return HolidayTable(path)
+    except (OSError, ValueError, struct.error) as table_error:
+        logging.info("Holiday table unavailable: %s", table_error)
+        return None
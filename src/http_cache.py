@@ -0,0 +1,121 @@
+""" Persistent SQLite cache for raw JSON API responses. """
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import TYPE_CHECKING, Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from metrics import span
+if TYPE_CHECKING:
+    from http_client import HttpClient
+
+SCHEMA_VERSION = 1
+DEFAULT_TTL = 30 * 24 * 60 * 60  # Astronomical data never changes, so a month is conservative
+
+def normalize_url(url: str) -> str:
+    """ Normalize a URL so equivalent requests share one cache key. """
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", query, ""))
+
+class ResponseCache():
+    """ Cache GET responses on disk, keyed by normalized URL, with TTL and revalidation. """
+    def __init__(self, http: "HttpClient", path: str = 'http_cache.db',
+                 ttl: float = DEFAULT_TTL):
+        self.http = http
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._setup()
+
+    def _setup(self):
+        """ Create the cache table, discarding entries from other schema versions. """
+        with self.lock:
+            version = self.conn.execute('PRAGMA user_version').fetchone()[0]
+            if version != SCHEMA_VERSION:
+                logging.info("HTTP cache schema %d is outdated, rebuilding as %d.",
+                             version, SCHEMA_VERSION)
+                self.conn.execute('DROP TABLE IF EXISTS responses')
+                self.conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS responses (
+                    url TEXT PRIMARY KEY,
+                    body TEXT,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_at REAL
+                )
+            ''')
+            self.conn.commit()
+
+    def _lookup(self, key: str):
+        """ Return the cached (body, etag, last_modified, fetched_at) row for a key. """
+        with self.lock:
+            return self.conn.execute(
+                'SELECT body, etag, last_modified, fetched_at FROM responses WHERE url = ?',
+                (key,)).fetchone()
+
+    def _store(self, key: str, body: str, etag, last_modified):
+        """ Insert or replace a cached response. """
+        with self.lock:
+            self.conn.execute('''
+                INSERT OR REPLACE INTO responses (url, body, etag, last_modified, fetched_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (key, body, etag, last_modified, time.time()))
+            self.conn.commit()
+
+    def _touch(self, key: str):
+        """ Mark a cached response as freshly validated. """
+        with self.lock:
+            self.conn.execute('UPDATE responses SET fetched_at = ? WHERE url = ?',
+                              (time.time(), key))
+            self.conn.commit()
+
+    def get_json(self, url: str) -> dict:
+        """ Return the JSON body for a URL, hitting the network only when needed. """
+        key = normalize_url(url)
+        row = self._lookup(key)
+        if row is not None and time.time() - row[3] < self.ttl:
+            logging.info("HTTP cache hit: %s", key)
+            return json.loads(row[0])
+
+        headers = {}
+        if row is not None:
+            if row[1]:
+                headers["If-None-Match"] = row[1]
+            if row[2]:
+                headers["If-Modified-Since"] = row[2]
+        logging.info("HTTP cache miss: %s", key)
+        with span("http.request"):
+            response = self.http.request("GET", url, headers=headers)
+        if response.status == 304 and row is not None:
+            logging.info("HTTP cache revalidated: %s", key)
+            self._touch(key)
+            return json.loads(row[0])
+        if response.status != 200:
+            logging.warning("HTTP %d for %s, response not cached.", response.status, key)
+            return response.json()
+        body = response.data.decode("utf-8")
+        self._store(key, body, response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"))
+        return json.loads(body)
+
+    def peek_json(self, url: str, fresh_only: bool = True) -> Optional[dict]:
+        """ Return the stored JSON body for a URL, or None, without a request.
+        Entries older than the TTL count as missing unless fresh_only is False. """
+        row = self._lookup(normalize_url(url))
+        if row is None or (fresh_only and time.time() - row[3] >= self.ttl):
+            return None
+        return json.loads(row[0])
+
+    def clear(self):
+        """ Remove every cached response. """
+        with self.lock:
+            self.conn.execute('DELETE FROM responses')
+            self.conn.commit()
+
+    def close(self):
+        """ Close the underlying database connection. """
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,146 @@
+""" One shared HTTP client with timeouts, jittered retries and request coalescing. """
+import functools
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+if TYPE_CHECKING:
+    import urllib3
+
+# Seconds to wait for a connection, and for each read of a response
+CONNECT_TIMEOUT = 5.0
+READ_TIMEOUT = 10.0
+# Hard limit on one request, including retries, backoff and reading the body
+REQUEST_DEADLINE = 20.0
+# Retries of a failed request, spaced by an exponential backoff with random jitter
+RETRIES = 3
+BACKOFF_FACTOR = 0.5
+BACKOFF_JITTER = 0.5
+BACKOFF_MAX = 5.0
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+MAX_REDIRECTS = 5
+# Bytes read at a time, checking the deadline in between
+READ_CHUNK_BYTES = 65536
+# Connections kept open per host
+POOL_SIZE = 8
+
+@dataclass
+class InFlight():
+    """ One request on the wire, shared by every caller asking for it meanwhile. """
+    done: threading.Event = field(default_factory=threading.Event)
+    response: Optional["urllib3.BaseHTTPResponse"] = None
+    error: Optional[BaseException] = None
+
+class HttpClient():
+    """ urllib3 pool with a deadline and jittered retries per request, coalescing identical
+    concurrent GETs. """
+    def __init__(self, pool_size: int = POOL_SIZE, deadline: float = REQUEST_DEADLINE,
+                 read_timeout: float = READ_TIMEOUT, retries: int = RETRIES):
+        # urllib3 and certifi are only needed once something goes on the network
+        import urllib3 # pylint: disable=import-outside-toplevel
+        import certifi # pylint: disable=import-outside-toplevel
+        self.http = urllib3.PoolManager(
+            maxsize=pool_size,
+            cert_reqs="CERT_REQUIRED",
+            ca_certs=certifi.where(),
+            # Retries are done here, within the deadline; urllib3 only follows redirects
+            retries=urllib3.Retry(total=None, connect=0, read=0, other=0, status=0,
+                                  redirect=MAX_REDIRECTS),
+        )
+        self.deadline = deadline
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.lock = threading.Lock()
+        self.in_flight: Dict[Tuple, InFlight] = {}
+        # Requests sent on the wire, and requests served by one already in flight
+        self.counts = {"sent": 0, "coalesced": 0}
+
+    def _attempt(self, method: str, url: str, headers: Optional[Dict[str, str]],
+                 deadline: float) -> "urllib3.BaseHTTPResponse":
+        """ Send a request once and read its whole body before the deadline. """
+        import urllib3 # pylint: disable=import-outside-toplevel
+        remaining = deadline - time.monotonic()
+        response = self.http.request(
+            method, url, headers=headers, preload_content=False,
+            timeout=urllib3.Timeout(connect=min(CONNECT_TIMEOUT, remaining),
+                                    read=min(self.read_timeout, remaining)))
+        try:
+            chunks = []
+            # A read timeout only bounds each read, so a trickling body is cut off here
+            while chunk := response.read1(READ_CHUNK_BYTES):
+                if time.monotonic() > deadline:
+                    raise urllib3.exceptions.TimeoutError(
+                        f"{url}: response not read within {self.deadline:.0f} s")
+                chunks.append(chunk)
+        finally:
+            response.release_conn()
+        return urllib3.HTTPResponse(body=b"".join(chunks), headers=response.headers,
+                                    status=response.status, request_url=url)
+
+    def _send(self, method: str, url: str,
+              headers: Optional[Dict[str, str]]) -> "urllib3.BaseHTTPResponse":
+        """ Send a request, retrying with jittered backoff while the deadline allows. """
+        import urllib3 # pylint: disable=import-outside-toplevel
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            try:
+                response = self._attempt(method, url, headers, deadline)
+                if response.status not in RETRY_STATUSES or attempt >= self.retries:
+                    return response
+                logging.warning("HTTP %d for %s, retrying", response.status, url)
+            except urllib3.exceptions.HTTPError as request_error:
+                if attempt >= self.retries or method not in ("GET", "HEAD"):
+                    raise
+                logging.warning("Request to %s failed (%s), retrying", url, request_error)
+            delay = (min(BACKOFF_MAX, BACKOFF_FACTOR * 2 ** attempt)
+                     + random.uniform(0, BACKOFF_JITTER))
+            if time.monotonic() + delay >= deadline:
+                raise urllib3.exceptions.TimeoutError(
+                    f"{url}: no response within {self.deadline:.0f} s")
+            time.sleep(delay)
+            attempt += 1
+
+    def request(self, method: str, url: str,
+                headers: Optional[Dict[str, str]] = None) -> "urllib3.BaseHTTPResponse":
+        """ Send a request; a GET or HEAD already in flight is waited for instead of resent. """
+        if method not in ("GET", "HEAD"):
+            return self._send(method, url, headers)
+        key = (method, url, tuple(sorted((headers or {}).items())))
+        with self.lock:
+            call = self.in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self.in_flight[key] = InFlight()
+                self.counts["sent"] += 1
+            else:
+                self.counts["coalesced"] += 1
+        if not leader:
+            logging.info("Waiting for in-flight request: %s", url)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.response
+        try:
+            # Bodies are read in full, so every waiting caller can read the same response
+            call.response = self._send(method, url, headers)
+            return call.response
+        except BaseException as request_error:
+            call.error = request_error
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            call.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        """ Requests sent on the wire and requests served by one already in flight. """
+        with self.lock:
+            return dict(self.counts)
+
+@functools.lru_cache(maxsize=None)
+def shared_client() -> HttpClient:
+    """ The application's HTTP client, created on first use. """
+    return HttpClient()
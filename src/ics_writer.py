@@ -0,0 +1,79 @@
+""" Streaming RFC 5545 (iCalendar) writer for holidays. """
+import datetime
+import uuid
+from typing import IO, Iterable, Iterator, Optional
+
+PRODID = "-//NorseCalendar//Norse Calendar Calculator//EN"
+# Stable UIDs so re-importing an export updates events instead of duplicating them
+UID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_DNS, "norsecalendar.github.io")
+LINE_OCTETS = 75
+
+def escape_text(value: str) -> str:
+    """ Escape a TEXT property value. """
+    return (value.replace("\\", "\\\\").replace(";", "\\;")
+            .replace(",", "\\,").replace("\r\n", "\\n").replace("\n", "\\n"))
+
+def fold(line: str) -> str:
+    """ Fold a content line at 75 octets, never splitting a UTF-8 character, and end it. """
+    if len(line) <= LINE_OCTETS // 4 or len(line.encode("utf-8")) <= LINE_OCTETS:
+        return line + "\r\n"
+    parts = []
+    current, size, limit = [], 0, LINE_OCTETS
+    for char in line:
+        width = len(char.encode("utf-8"))
+        if size + width > limit:
+            parts.append("".join(current))
+            # Continuation lines start with a space, which counts towards their length
+            current, size, limit = [], 0, LINE_OCTETS - 1
+        current.append(char)
+        size += width
+    parts.append("".join(current))
+    return "\r\n ".join(parts) + "\r\n"
+
+def _date(value) -> datetime.date:
+    """ Date of a stored '%Y-%m-%d' string or a datetime. """
+    if isinstance(value, str):
+        return datetime.date.fromisoformat(value)
+    return value.date() if isinstance(value, datetime.datetime) else value
+
+def iter_event(holiday, stamp: str) -> Iterator[str]:
+    """ Content lines of one all-day VEVENT. """
+    start = _date(holiday.start_date)
+    yield "BEGIN:VEVENT\r\n"
+    yield f"UID:{uuid.uuid5(UID_NAMESPACE, f'{holiday.name}/{start.isoformat()}')}\r\n"
+    yield f"DTSTAMP:{stamp}\r\n"
+    yield f"DTSTART;VALUE=DATE:{start:%Y%m%d}\r\n"
+    if holiday.end_date is not None:
+        # DTEND is exclusive, so an all-day event ends the day after its last day
+        yield f"DTEND;VALUE=DATE:{_date(holiday.end_date) + datetime.timedelta(days=1):%Y%m%d}\r\n"
+    yield fold("SUMMARY:" + escape_text(holiday.name))
+    yield fold("DESCRIPTION:" + escape_text(
+        f"Description: {holiday.description}\nSchedule: {holiday.schedule}"))
+    yield "END:VEVENT\r\n"
+
+CALENDAR_HEADER = ("BEGIN:VCALENDAR\r\n"
+                   "VERSION:2.0\r\n"
+                   f"PRODID:{PRODID}\r\n"
+                   "CALSCALE:GREGORIAN\r\n")
+CALENDAR_FOOTER = "END:VCALENDAR\r\n"
+
+def format_stamp(stamp: Optional[datetime.datetime] = None) -> str:
+    """ DTSTAMP value for a UTC datetime, defaulting to now. """
+    return (stamp or datetime.datetime.now(datetime.timezone.utc)).strftime('%Y%m%dT%H%M%SZ')
+
+def event_text(holiday, stamp: str) -> str:
+    """ One VEVENT as text. """
+    return "".join(iter_event(holiday, stamp))
+
+def iter_calendar(holidays: Iterable, stamp: Optional[datetime.datetime] = None
+                  ) -> Iterator[str]:
+    """ Content lines of a VCALENDAR holding every holiday, produced one event at a time. """
+    dtstamp = format_stamp(stamp)
+    yield CALENDAR_HEADER
+    for holiday in holidays:
+        yield from iter_event(holiday, dtstamp)
+    yield CALENDAR_FOOTER
+
+def write_calendar(output: IO[str], holidays: Iterable) -> None:
+    """ Write holidays to a text file opened with newline='' as an iCalendar stream. """
+    output.writelines(iter_calendar(holidays))
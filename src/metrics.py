@@ -0,0 +1,141 @@
+""" Timing spans aggregated into histograms, exported as Prometheus text or JSON. """
+import bisect
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+# Spans are only timed once enable() is called
+ENABLED = False
+# Histogram bucket upper bounds in seconds
+BUCKETS: Tuple[float, ...] = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                              0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRIC_NAME = "norse_calendar_span_seconds"
+
+class Histogram():
+    """ Count, sum, maximum and bucketed durations of one span. """
+    def __init__(self):
+        # counts[i] holds durations up to BUCKETS[i]; the last entry is +Inf
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        """ Add one duration. """
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, data: dict):
+        """ Add another histogram's snapshot. """
+        for index, count in enumerate(data["counts"]):
+            self.counts[index] += count
+        self.count += data["count"]
+        self.sum += data["sum"]
+        self.max = max(self.max, data["max"])
+
+    def snapshot(self) -> dict:
+        """ The histogram as plain data. """
+        return {"count": self.count, "sum": self.sum, "max": self.max,
+                "counts": list(self.counts)}
+
+lock = threading.Lock()
+histograms: Dict[str, Histogram] = {}
+
+def enable():
+    """ Start timing spans. """
+    global ENABLED # pylint: disable=global-statement
+    ENABLED = True
+
+def disable():
+    """ Stop timing spans, keeping what was recorded. """
+    global ENABLED # pylint: disable=global-statement
+    ENABLED = False
+
+def observe(name: str, seconds: float):
+    """ Record one duration of a span. """
+    with lock:
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = Histogram()
+        histogram.observe(seconds)
+
+@contextlib.contextmanager
+def _timing(name: str) -> Iterator[None]:
+    """ Time the body of a with statement. """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started)
+
+# Shared do-nothing context for disabled spans
+_NOT_TIMED = contextlib.nullcontext()
+
+def span(name: str):
+    """ Context manager timing its body as the named span, when enabled. """
+    return _timing(name) if ENABLED else _NOT_TIMED
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """ Decorator timing every call of a function as the named span, when enabled. """
+    def decorate(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+def snapshot(reset: bool = False) -> Dict[str, dict]:
+    """ Every span's histogram as plain data, optionally starting afresh. """
+    with lock:
+        spans = {name: histogram.snapshot() for name, histogram in sorted(histograms.items())}
+        if reset:
+            histograms.clear()
+    return spans
+
+def merge(spans: Dict[str, dict]):
+    """ Add spans recorded elsewhere, e.g. by a worker process. """
+    with lock:
+        for name, data in spans.items():
+            histograms.setdefault(name, Histogram()).merge(data)
+
+def to_json(spans: Optional[Dict[str, dict]] = None) -> str:
+    """ JSON snapshot with bucket bounds, counts, sums and maxima by span. """
+    spans = snapshot() if spans is None else spans
+    return json.dumps({"timestamp": time.time(), "buckets": list(BUCKETS) + ["+Inf"],
+                       "spans": spans}, indent=2)
+
+def to_prometheus(spans: Optional[Dict[str, dict]] = None) -> str:
+    """ Prometheus text exposition of every span's histogram. """
+    spans = snapshot() if spans is None else spans
+    lines = [f"# HELP {METRIC_NAME} Duration of instrumented operations.",
+             f"# TYPE {METRIC_NAME} histogram"]
+    for name, data in spans.items():
+        label = name.replace("\\", "\\\\").replace('"', '\\"')
+        cumulative = 0
+        for bound, count in zip(list(BUCKETS) + ["+Inf"], data["counts"]):
+            cumulative += count
+            lines.append(f'{METRIC_NAME}_bucket{{span="{label}",le="{bound}"}} {cumulative}')
+        lines.append(f'{METRIC_NAME}_sum{{span="{label}"}} {data["sum"]:.9f}')
+        lines.append(f'{METRIC_NAME}_count{{span="{label}"}} {data["count"]}')
+    return "\n".join(lines) + "\n"
+
+def write(path: str):
+    """ Write every span as JSON if path ends in .json, else as Prometheus text. """
+    text = to_json() if path.endswith(".json") else to_prometheus()
+    # Replace the file in one step so collectors never read a partial file
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w', encoding="utf-8") as metrics_file:
+        metrics_file.write(text)
+    os.replace(temporary, path)
@@ -1,24 +1,38 @@
 """ Import Modules """
-
+import time
+STARTED = time.perf_counter()
+# pylint: disable=wrong-import-position
+import argparse
 import logging
+import logging.handlers
+import queue
+import threading
 import webbrowser
-import sys
-import sqlite3
 import tkinter as tk
-from tkinter import messagebox
-import urllib3
-import certifi
+from typing import Dict, Optional
 from ui import UI
-
-# Initialize HTTP Pool Manager
-http = urllib3.PoolManager(
-    cert_reqs="CERT_REQUIRED",
-    ca_certs=certifi.where()
+from database import db_setup, database
+from holiday_cache import holiday_cache
+from http_client import shared_client
+from calculate_dates import source_stats
+import metrics
+
+CURRENT_VERSION = "2.1.0"  # Current version of the application
+LATEST_RELEASE_URL = (
+    "https://api.github.com/repos/"
+    "michelfrancisbustillos/norsecalendar/releases/latest"
 )
+# How often the main window checks for background check results
+CHECK_POLL_MS = 200
+# debug.log is rotated at this size, keeping this many earlier logs
+LOG_MAX_BYTES = 5 * 2**20
+LOG_BACKUPS = 3
 
 # Configure logging
-logging.basicConfig(filename="debug.log",
-                    filemode='w',
+# Keep earlier runs' logs instead of truncating debug.log on every start
+logging.basicConfig(handlers=[logging.handlers.RotatingFileHandler(
+                        "debug.log", maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS,
+                        encoding="utf-8")],
                     format='%(asctime)s - %(levelname)s - %(message)s',
                     level=logging.INFO)
 
@@ -27,11 +41,7 @@ logging.info("Starting Norse Calendar Calculator")
 def download_latest_release():
     """ Open web browser to download latest release. """
     logging.info("Opening web browser to download latest release...")
-    url = (
-        "https://api.github.com/repos/"
-        "michelfrancisbustillos/norsecalendar/releases/latest"
-    )
-    response = http.request("GET", url)
+    response = shared_client().request("GET", LATEST_RELEASE_URL)
     latest_version = response.json()["name"]
     base = "https://github.com/michelfrancisbustillos/norsecalendar/releases/download/"
     exe = "/norse_calendar.exe"
@@ -41,126 +51,158 @@ def download_latest_release():
     change_log_url = f"{base}{latest_version}"
     webbrowser.open(change_log_url)
 
-def update_check():
-    """ Check for updates to the application. """
+def fetch_latest_version() -> Optional[str]:
+    """ Latest released version, or None if it cannot be checked. """
+    import urllib3 # pylint: disable=import-outside-toplevel
     logging.info("Checking for updates...")
     try:
-        url = (
-            "https://api.github.com/repos/"
-            "michelfrancisbustillos/norsecalendar/releases/latest"
-        )
-        response = http.request("GET", url)
-        latest_version = response.json()["name"]
-        latest_version = latest_version.replace("v", "")
-        current_version = "2.1.0"  # Current version of the application
-        if latest_version > current_version:
-            update_dialog = tk.Tk()
-            update_dialog.title("Norse Calendar Calculator")
-
-            header = tk.Label(update_dialog, text="Norse Calendar Calculator",
-                              font=("Arial", 25))
-            header.pack()
-
-            link_text = "A new version is available. Click here to download."
-            link = tk.Label(update_dialog, text=link_text,
-                            fg="blue", cursor="hand2")
-            link.pack()
-            link.bind("<Button-1>", lambda e: download_latest_release())
-
-            info_text = (f"Current version: {current_version}\n"
-                         f"Latest version: {latest_version}")
-            info = tk.Label(update_dialog, text=info_text)
-            info.pack()
-
-            ok_button = tk.Button(update_dialog, text="OK", command=update_dialog.destroy)
-            ok_button.pack()
-
-            update_dialog.mainloop()
-            logging.warning("Update available: %s", latest_version)
-        elif latest_version < current_version:
-            update_dialog = tk.Tk()
-            update_dialog.title("Norse Calendar Calculator")
-
-            header = tk.Label(update_dialog, text="Norse Calendar Calculator",
-                              font=("Arial", 25))
-            header.pack()
-            warning_label = tk.Label(update_dialog,
-                                     text="You are using a beta version!",
-                                     fg="red")
-            warning_label.pack()
-            link_text = "Click here to download the latest stable version."
-            link = tk.Label(update_dialog, text=link_text,
-                            fg="blue", cursor="hand2")
-            link.pack()
-            link.bind("<Button-1>", lambda e: download_latest_release())
-
-            info_text = (f"Current version: {current_version}\n"
-                         f"Latest version: {latest_version}")
-            info = tk.Label(update_dialog, text=info_text)
-            info.pack()
-
-            ok_button = tk.Button(update_dialog, text="OK", command=update_dialog.destroy)
-            ok_button.pack()
-
-            update_dialog.mainloop()
-            logging.warning("Beta Version In Use! %s", current_version)
-        else:
-            logging.info("No updates available.")
-    except urllib3.exceptions.MaxRetryError as update_error:
+        response = shared_client().request("GET", LATEST_RELEASE_URL)
+        return response.json()["name"].replace("v", "")
+    except (urllib3.exceptions.HTTPError, ValueError, KeyError) as update_error:
         logging.exception("Error checking for updates: %s", update_error)
-
-def db_setup():
-    """ Set up the SQLite database for storing holidays. """
-    conn = sqlite3.connect('norse_calendar.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS holidays (
-            id INTEGER PRIMARY KEY,
-            name TEXT,
-            start_date TEXT,
-            end_date TEXT,
-            description TEXT,
-            schedule TEXT
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS years (
-            id INTEGER PRIMARY KEY,
-            year INTEGER
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS moon_phases (
-            id INTEGER PRIMARY KEY,
-            phase TEXT,
-            date TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
-    logging.info("Database setup complete.")
+        return None
+
+def update_check(window: tk.Tk, latest_version: Optional[str]):
+    """ Tell the user about a newer release or a beta build. """
+    if latest_version is None:
+        return
+    current_version = CURRENT_VERSION
+    if latest_version > current_version:
+        update_dialog = tk.Toplevel(window)
+        update_dialog.title("Norse Calendar Calculator")
+
+        header = tk.Label(update_dialog, text="Norse Calendar Calculator",
+                          font=("Arial", 25))
+        header.pack()
+
+        link_text = "A new version is available. Click here to download."
+        link = tk.Label(update_dialog, text=link_text,
+                        fg="blue", cursor="hand2")
+        link.pack()
+        link.bind("<Button-1>", lambda e: download_latest_release())
+
+        info_text = (f"Current version: {current_version}\n"
+                     f"Latest version: {latest_version}")
+        info = tk.Label(update_dialog, text=info_text)
+        info.pack()
+
+        ok_button = tk.Button(update_dialog, text="OK", command=update_dialog.destroy)
+        ok_button.pack()
+        logging.warning("Update available: %s", latest_version)
+    elif latest_version < current_version:
+        update_dialog = tk.Toplevel(window)
+        update_dialog.title("Norse Calendar Calculator")
+
+        header = tk.Label(update_dialog, text="Norse Calendar Calculator",
+                          font=("Arial", 25))
+        header.pack()
+        warning_label = tk.Label(update_dialog,
+                                 text="You are using a beta version!",
+                                 fg="red")
+        warning_label.pack()
+        link_text = "Click here to download the latest stable version."
+        link = tk.Label(update_dialog, text=link_text,
+                        fg="blue", cursor="hand2")
+        link.pack()
+        link.bind("<Button-1>", lambda e: download_latest_release())
+
+        info_text = (f"Current version: {current_version}\n"
+                     f"Latest version: {latest_version}")
+        info = tk.Label(update_dialog, text=info_text)
+        info.pack()
+
+        ok_button = tk.Button(update_dialog, text="OK", command=update_dialog.destroy)
+        ok_button.pack()
+        logging.warning("Beta Version In Use! %s", current_version)
+    else:
+        logging.info("No updates available.")
 
 def check_api_connection() -> bool:
-    """ Check API Connection. """
+    """ Check API Connection. The API is only used as an optional cross-check. """
+    import urllib3 # pylint: disable=import-outside-toplevel
     try:
-        http.request("GET", "https://aa.usno.navy.mil/api/")
+        shared_client().request("GET", "https://aa.usno.navy.mil/api/")
         logging.info("API Connection Successful")
         return True
-    except urllib3.exceptions.MaxRetryError:
-        err_msg = ("Could not connect to the API. "
-                   "Please check your internet connection.")
-        messagebox.showerror("API Connection Error", err_msg)
-        logging.error("API Connection Error")
-        sys.exit(1)
+    except urllib3.exceptions.HTTPError:
+        logging.warning("API Connection Error, using built-in astronomical engine only")
+        return False
+
+def start_background_checks(window: tk.Tk):
+    """ Run the update and API checks off the Tk thread, then report the update check. """
+    results: queue.Queue = queue.Queue()
+
+    def run_checks():
+        """ Worker thread: network checks only, no Tk calls. """
+        latest_version = None
+        try:
+            latest_version = fetch_latest_version()
+        except Exception: # pylint: disable=broad-exception-caught
+            # e.g. a release whose name is not a string
+            logging.exception("Update check failed")
+        finally:
+            # Always report, or poll_results would keep polling for good
+            results.put(latest_version)
+        check_api_connection()
+
+    def poll_results():
+        """ Show the update check result on the Tk thread once it is ready. """
+        try:
+            latest_version = results.get_nowait()
+        except queue.Empty:
+            window.after(CHECK_POLL_MS, poll_results)
+            return
+        update_check(window, latest_version)
+
+    threading.Thread(target=run_checks, daemon=True).start()
+    window.after(CHECK_POLL_MS, poll_results)
+
+def report_startup(marks: Dict[str, float]):
+    """ Print and log time from process start to each startup stage. """
+    for stage, seconds in marks.items():
+        report = f"{stage}: {(seconds - STARTED) * 1000:.1f} ms"
+        print(report)
+        logging.info("Startup profile - %s", report)
 
 if __name__ == '__main__':
-    update_check()
-    check_api_connection()
+    parser = argparse.ArgumentParser(description="Norse Calendar Calculator")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="report the time taken to show the first window")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="time hot paths and write histograms to FILE at exit "
+                             "(JSON if it ends in .json, else Prometheus text)")
+    args = parser.parse_args()
+    if args.metrics:
+        metrics.enable()
+    startup_marks = {"imports": time.perf_counter()}
     db_setup()
+    startup_marks["database"] = time.perf_counter()
     #setup_gui()
     logging.info("Setting up GUI")
-    window = tk.Tk()
-    window.title("Norse Calendar Calculator")
-    ui = UI(window)
-    window.mainloop()
+    main_window = tk.Tk()
+    main_window.title("Norse Calendar Calculator")
+    ui = UI(main_window)
+    startup_marks["ui built"] = time.perf_counter()
+    if args.startup_profile:
+        def first_map(event):
+            """ Record when the main window is first mapped. """
+            if event.widget is main_window and "first window" not in startup_marks:
+                startup_marks["first window"] = time.perf_counter()
+                report_startup(startup_marks)
+        main_window.bind("<Map>", first_map, add="+")
+    # Network checks wait until the window is up
+    main_window.after_idle(start_background_checks, main_window)
+    main_window.mainloop()
+    database.close()
+    logging.info("Holiday cache: %(hits)d hits, %(misses)d misses, %(size)d/%(maxsize)d years.",
+                 holiday_cache.stats())
+    for chain, sources in source_stats().items():
+        for source, stats in sources.items():
+            logging.info("Data source %s/%s: %d requests, %d hits, %d misses, %d errors, "
+                         "%.3f s total, %.3f s max.", chain, source, stats["requests"],
+                         stats["hits"], stats["misses"], stats["errors"],
+                         stats["total_seconds"], stats["max_seconds"])
+    if args.metrics:
+        metrics.write(args.metrics)
+        logging.info("Metrics written to %s", args.metrics)
     logging.info("Exiting Norse Calendar Calculator")
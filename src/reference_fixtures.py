@@ -0,0 +1,106 @@
+""" Reference fixtures from PyEphem: python -m reference_fixtures YEAR... [--tz H --dst]
+
+Writes seasons and moon phases fixtures shaped like USNO responses, calculated by PyEphem
+(libastro's VSOP87 and ELP 2000-82 theories), which shares no code with astronomy.py. They
+let verify_engine check the engine across 1701-2100 where no USNO recording is available.
+US daylight saving is taken from the tz database's CST6CDT zone, which follows the federal
+rules. Apsides are left out: PyEphem keeps distances in single precision, too coarse to time
+them, and verify_engine does not check them. PyEphem is only needed to write fixtures:
+pip install ephem
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import zoneinfo
+from typing import Callable, List
+from data_sources import fixture_path, moon_phases_key, seasons_key
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "reference")
+MOON_PHASES = 50
+# Offset of the CST6CDT zone, whose daylight saving stands in for the US rules
+US_RULES_OFFSET = datetime.timedelta(hours=6)
+
+def us_dst(local_standard: datetime.datetime) -> bool:
+    """ Whether US daylight saving applies to a local standard time, per the tz database. """
+    instant = (local_standard + US_RULES_OFFSET).replace(tzinfo=datetime.timezone.utc)
+    return bool(instant.astimezone(zoneinfo.ZoneInfo("CST6CDT")).dst())
+
+def local_time(instant: datetime.datetime, tz: int, dst: bool) -> datetime.datetime:
+    """ A UT instant at a fixed offset, an hour later while US daylight saving applies. """
+    local = instant + datetime.timedelta(hours=tz)
+    if dst and us_dst(local):
+        local += datetime.timedelta(hours=1)
+    return local
+
+def entry(instant: datetime.datetime) -> dict:
+    """ Date and time fields of a USNO entry, rounded to the minute. """
+    rounded = (instant + datetime.timedelta(seconds=30)).replace(second=0, microsecond=0)
+    return {"year": rounded.year, "month": rounded.month, "day": rounded.day,
+            "time": rounded.strftime('%H:%M')}
+
+def seasons(year: int, tz: int, dst: bool) -> dict:
+    """ Earth's equinoxes and solstices for a year, shaped like the USNO 'seasons' response. """
+    import ephem # pylint: disable=import-outside-toplevel,import-error
+    start = ephem.Date(datetime.datetime(year, 1, 1))
+    events = [
+        ("Equinox", ephem.next_vernal_equinox(start).datetime()),
+        ("Solstice", ephem.next_summer_solstice(start).datetime()),
+        ("Equinox", ephem.next_autumnal_equinox(start).datetime()),
+        ("Solstice", ephem.next_winter_solstice(start).datetime()),
+    ]
+    return {"source": source(), "year": year, "tz": tz, "dst": dst,
+            "data": [{"phenom": phenom, **entry(local_time(instant, tz, dst))}
+                     for phenom, instant in events]}
+
+def moon_phases(start: datetime.date, nump: int) -> dict:
+    """ The next nump moon phases from a UT date, shaped like the USNO 'moon/phases/date'
+    response. """
+    import ephem # pylint: disable=import-outside-toplevel,import-error
+    finders: List[Callable] = [ephem.next_new_moon, ephem.next_first_quarter_moon,
+                               ephem.next_full_moon, ephem.next_last_quarter_moon]
+    names = ("New Moon", "First Quarter", "Full Moon", "Last Quarter")
+    date = ephem.Date(datetime.datetime(start.year, start.month, start.day))
+    phasedata = []
+    while len(phasedata) < nump:
+        phase, instant = min(((name, finder(date)) for name, finder in zip(names, finders)),
+                             key=lambda found: found[1])
+        phasedata.append({**entry(instant.datetime()), "phase": phase})
+        date = ephem.Date(instant + ephem.minute)
+    return {"source": source(), "year": start.year, "month": start.month, "day": start.day,
+            "numphases": nump, "phasedata": phasedata}
+
+def source() -> str:
+    """ Provenance noted in every reference fixture. """
+    import ephem # pylint: disable=import-outside-toplevel,import-error
+    return (f"Calculated with PyEphem {ephem.__version__} by python -m reference_fixtures; "
+            "US daylight saving from the tz database CST6CDT zone. Not a USNO response.")
+
+def write(path: str, response: dict) -> None:
+    """ Write one fixture, formatted like the transcribed USNO fixtures. """
+    with open(path, 'w', encoding="utf-8") as fixture:
+        json.dump(response, fixture, indent=1)
+        fixture.write("\n")
+    logging.info("Wrote %s", path)
+
+def write_fixtures(directory: str, years: List[int], tz: int, dst: bool) -> None:
+    """ Write seasons and moon phases fixtures for each year. """
+    os.makedirs(directory, exist_ok=True)
+    for year in years:
+        write(fixture_path(directory, "seasons", seasons_key(year, tz, dst)),
+              seasons(year, tz, dst))
+        start = datetime.date(year, 1, 1)
+        write(fixture_path(directory, "moon", moon_phases_key(start, MOON_PHASES)),
+              moon_phases(start, MOON_PHASES))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog="python -m reference_fixtures",
+                                     description=__doc__.split("\n", 1)[0])
+    parser.add_argument("years", type=int, nargs="+", metavar="YEAR")
+    parser.add_argument("--tz", type=int, default=0, help="hours from UT (default: 0)")
+    parser.add_argument("--dst", action="store_true", help="apply US daylight saving")
+    parser.add_argument("--fixtures", default=FIXTURES, help="fixture directory")
+    args = parser.parse_args()
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
+    write_fixtures(args.fixtures, args.years, args.tz, args.dst)
@@ -0,0 +1,290 @@
+""" Asyncio HTTP service: python -m server [--host HOST] [--port PORT]
+
+GET /holidays?year=Y or ?start=S&end=E      JSON list of holidays
+GET /calendar.ics?year=Y or ?start=S&end=E  iCalendar file
+GET /metrics                                Prometheus timing histograms, with --metrics
+"""
+import argparse
+import asyncio
+import gzip
+import hashlib
+import logging
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+from calculate_dates import TABLE_YEARS, get_holidays_range
+from database import database, db_setup
+from generators import iter_export
+import metrics
+
+# Longest range one request may ask for
+MAX_YEARS = 400
+# Years a request may ask for: the supported range, so clients cannot make the server
+# compute and store arbitrary years
+MIN_YEAR, MAX_YEAR = TABLE_YEARS
+# Bytes of rendered payloads kept in memory; a 1701-2100 calendar is about 4 MB
+PAYLOAD_CACHE_BYTES = 64 * 2**20
+MAX_HEADER_BYTES = 16384
+
+ENDPOINTS = {
+    "/holidays": ("json", "application/json; charset=utf-8"),
+    "/calendar.ics": ("ics", "text/calendar; charset=utf-8"),
+}
+REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 500: "Internal Server Error"}
+
+# One entity tag, strong or weak, or * in an If-None-Match list
+ENTITY_TAG = re.compile(r'\*|(?:W/)?"[^"]*"')
+
+PayloadKey = Tuple[str, int, int]
+
+class RequestError(Exception):
+    """ A request that gets an error response with the given status. """
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+@dataclass(frozen=True)
+class Payload():
+    """ A serialized response body and its gzip encoding, each with its own entity tag. """
+    body: bytes
+    gzipped: bytes
+    etag: str
+    gzip_etag: str
+    content_type: str
+
+    @property
+    def size(self) -> int:
+        """ Bytes held by both encodings. """
+        return len(self.body) + len(self.gzipped)
+
+@metrics.timed("server.render_payload")
+def render_payload(path: str, start: int, end: int) -> Payload:
+    """ Serialize an endpoint's response for a range of years. """
+    export_format, content_type = ENDPOINTS[path]
+    logging.info("Rendering %s for years %d-%d", path, start, end)
+    body = "".join(iter_export(export_format, get_holidays_range(start, end))).encode("utf-8")
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    return Payload(body, gzip.compress(body, compresslevel=6, mtime=0), f'"{digest}"',
+                   f'"{digest}-gz"', content_type)
+
+class PayloadCache():
+    """ Payloads by (path, start, end), least recently used first, bounded by their total
+    size. Only touched on the event loop. """
+    def __init__(self, max_bytes: int = PAYLOAD_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.futures: "OrderedDict[PayloadKey, asyncio.Future]" = OrderedDict()
+        # Sizes of the rendered payloads; renders still running are not counted
+        self.sizes: Dict[PayloadKey, int] = {}
+        self.total_bytes = 0
+
+    def get(self, key: PayloadKey) -> Optional[asyncio.Future]:
+        """ The future of a cached or rendering payload, marked as recently used. """
+        future = self.futures.get(key)
+        if future is not None:
+            self.futures.move_to_end(key)
+        return future
+
+    def add(self, key: PayloadKey, future: asyncio.Future):
+        """ Cache a payload that is being rendered. """
+        self.futures[key] = future
+
+    def rendered(self, key: PayloadKey, future: asyncio.Future, payload: Payload):
+        """ Count a finished payload, evicting the least recently used beyond max_bytes. """
+        if self.futures.get(key) is not future or key in self.sizes:
+            return
+        self.sizes[key] = payload.size
+        self.total_bytes += payload.size
+        while self.total_bytes > self.max_bytes and self.futures:
+            self.discard(next(iter(self.futures)))
+
+    def discard(self, key: PayloadKey):
+        """ Drop a payload, e.g. one that failed to render. """
+        self.futures.pop(key, None)
+        self.total_bytes -= self.sizes.pop(key, 0)
+
+payloads = PayloadCache()
+
+async def payload_for(path: str, start: int, end: int) -> Payload:
+    """ A cached payload, rendered once off the event loop however many requests want it. """
+    key = (path, start, end)
+    future = payloads.get(key)
+    if future is None:
+        future = asyncio.get_running_loop().run_in_executor(None, render_payload, *key)
+        payloads.add(key, future)
+    try:
+        payload = await future
+    except Exception:
+        # Let the next request try again
+        if payloads.get(key) is future:
+            payloads.discard(key)
+        raise
+    payloads.rendered(key, future, payload)
+    return payload
+
+def parse_years(query: str) -> Tuple[int, int]:
+    """ (start, end) from ?year= or ?start=&end= query parameters. """
+    params = parse_qs(query)
+    try:
+        if "year" in params:
+            start = end = int(params["year"][0])
+        else:
+            start = int(params["start"][0])
+            end = int(params.get("end", params["start"])[0])
+    except (KeyError, ValueError) as query_error:
+        raise RequestError(400, "Expected ?year=YYYY or ?start=YYYY&end=YYYY") from query_error
+    if not MIN_YEAR <= start <= MAX_YEAR or not MIN_YEAR <= end <= MAX_YEAR:
+        raise RequestError(400, f"Years must be between {MIN_YEAR} and {MAX_YEAR}")
+    if end < start or end - start >= MAX_YEARS:
+        raise RequestError(400, f"Year range must be ascending and at most {MAX_YEARS} years")
+    return start, end
+
+def response(status: int, headers: Dict[str, str], body: bytes = b"",
+             head: bool = False) -> bytes:
+    """ Encode an HTTP/1.1 response. """
+    lines = [f"HTTP/1.1 {status} {REASONS[status]}"]
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    if status != 304:
+        lines.append(f"Content-Length: {len(body)}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (b"" if head else body)
+
+def error_response(status: int, message: str, head: bool = False) -> bytes:
+    """ A plain text error response. """
+    return response(status, {"Content-Type": "text/plain; charset=utf-8"},
+                    (message + "\n").encode("utf-8"), head)
+
+def metrics_response(head: bool = False) -> bytes:
+    """ Timing histograms in the Prometheus text format. """
+    return response(200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8",
+                          "Cache-Control": "no-store"},
+                    metrics.to_prometheus().encode("utf-8"), head)
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """ Whether an Accept-Encoding header allows gzip, honouring q-values. """
+    qualities = {}
+    for coding in accept_encoding.lower().split(","):
+        name, *params = (part.strip() for part in coding.split(";"))
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        qualities[name] = quality
+    return qualities.get("gzip", qualities.get("x-gzip", qualities.get("*", 0.0))) > 0
+
+def entity_tags(if_none_match: str) -> List[str]:
+    """ Opaque tags of an If-None-Match list, without W/ as weak comparison ignores it. """
+    return [tag.removeprefix("W/") for tag in ENTITY_TAG.findall(if_none_match)]
+
+async def handle_request(method: str, target: str, headers: Dict[str, str]) -> bytes:
+    """ Build the response to one request. """
+    head = method == "HEAD"
+    if method not in ("GET", "HEAD"):
+        return error_response(405, "Only GET and HEAD are supported", head)
+    url = urlsplit(target)
+    if url.path not in ENDPOINTS:
+        return (metrics_response(head) if url.path == "/metrics" and metrics.ENABLED
+                else error_response(404, f"Unknown path {url.path}", head))
+    try:
+        start, end = parse_years(url.query)
+    except RequestError as request_error:
+        return error_response(request_error.status, str(request_error), head)
+    payload = await payload_for(url.path, start, end)
+    gzipped = accepts_gzip(headers.get("accept-encoding", ""))
+    etag = payload.gzip_etag if gzipped else payload.etag
+    common = {"ETag": etag, "Vary": "Accept-Encoding",
+              "Cache-Control": "public, max-age=86400"}
+    tags = entity_tags(headers.get("if-none-match", ""))
+    if "*" in tags or etag in tags:
+        return response(304, common, head=True)
+    common["Content-Type"] = payload.content_type
+    if gzipped:
+        common["Content-Encoding"] = "gzip"
+        return response(200, common, payload.gzipped, head)
+    return response(200, common, payload.body, head)
+
+async def read_request(reader: asyncio.StreamReader
+                       ) -> Optional[Tuple[str, str, str, Dict[str, str]]]:
+    """ Method, target, version and lower-cased headers of the next request, or None at EOF. """
+    try:
+        data = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    except asyncio.LimitOverrunError as overrun:
+        raise RequestError(400, "Request headers too large") from overrun
+    request_line, *header_lines = data.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = request_line.split(" ")
+    except ValueError as line_error:
+        raise RequestError(400, "Malformed request line") from line_error
+    headers = {}
+    for line in header_lines:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    return method, target, version, headers
+
+async def serve_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """ Serve requests on one keep-alive connection until the client closes it. """
+    try:
+        while True:
+            try:
+                request = await read_request(reader)
+            except RequestError as request_error:
+                writer.write(error_response(request_error.status, str(request_error)))
+                break
+            if request is None:
+                break
+            method, target, version, headers = request
+            try:
+                writer.write(await handle_request(method, target, headers))
+            except Exception: # pylint: disable=broad-exception-caught
+                logging.exception("Error serving %s", target)
+                writer.write(error_response(500, "Internal server error"))
+                break
+            await writer.drain()
+            connection = headers.get("connection", "").lower()
+            if connection == "close" or (version == "HTTP/1.0" and connection != "keep-alive"):
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+async def serve(host: str, port: int, warm: Optional[Tuple[int, int]] = None):
+    """ Run the HTTP service until cancelled. """
+    if warm is not None:
+        # Pre-render common payloads so the first subscribers hit the cache
+        for path in ENDPOINTS:
+            await payload_for(path, *warm)
+    server = await asyncio.start_server(serve_connection, host, port, limit=MAX_HEADER_BYTES)
+    logging.info("Serving on %s", ", ".join(str(sock.getsockname()) for sock in server.sockets))
+    async with server:
+        await server.serve_forever()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog="python -m server",
+                                     description="Serve Norse Calendar holidays over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--warm", type=int, nargs=2, metavar=("START", "END"),
+                        help="pre-render this range of years at startup")
+    parser.add_argument("--metrics", action="store_true",
+                        help="time hot paths and serve the histograms at /metrics")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log requests to stderr")
+    args = parser.parse_args()
+    if args.metrics:
+        metrics.enable()
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s',
+                        level=logging.INFO if args.verbose else logging.WARNING)
+    db_setup()
+    try:
+        asyncio.run(serve(args.host, args.port, tuple(args.warm) if args.warm else None))
+    except KeyboardInterrupt:
+        logging.info("Server stopped")
+    finally:
+        database.close()
@@ -0,0 +1,111 @@
+""" Typed in-memory model behind the Table View, with cached sort orders and a search index. """
+import bisect
+import datetime
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+COLUMNS = ("Name", "Start", "End", "Description", "Schedule")
+DATE_COLUMNS = ("Start", "End")
+# Columns covered by the search box
+SEARCH_COLUMNS = ("Name", "Description")
+# Missing end dates sort after every real date
+NO_DATE = datetime.date.max.toordinal() + 1
+WORD = re.compile(r"\w+")
+
+def date_ordinal(value: Optional[str]) -> int:
+    """ Ordinal of a stored '%Y-%m-%d' date, or NO_DATE if missing. """
+    return datetime.date.fromisoformat(value).toordinal() if value else NO_DATE
+
+@dataclass(frozen=True)
+class TableRow():
+    """ One Table View row: display values plus parsed sort keys. """
+    values: Tuple[str, ...]
+    start: int
+    end: int
+
+    @classmethod
+    def from_holiday(cls, holiday) -> "TableRow":
+        """ Build a row from a holiday, with blanks for missing fields. """
+        return cls((holiday.name,
+                    holiday.start_date,
+                    holiday.end_date if holiday.end_date else "",
+                    holiday.description if holiday.description else "",
+                    holiday.schedule if holiday.schedule else ""),
+                   date_ordinal(holiday.start_date),
+                   date_ordinal(holiday.end_date))
+
+    def sort_key(self, column: str):
+        """ Key ordering this row within a column. """
+        if column == "Start":
+            return self.start
+        if column == "End":
+            return self.end
+        return self.values[COLUMNS.index(column)].casefold()
+
+class TableModel():
+    """ Rows of the Table View, indexed by position, with orderings built once per column. """
+    def __init__(self):
+        self.rows: List[TableRow] = []
+        self.orders: Dict[str, List[int]] = {}
+        self.words: Dict[str, Set[int]] = {}
+        self.vocabulary: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def extend(self, holidays: Iterable) -> range:
+        """ Append holidays and index them, returning their row ids. """
+        first = len(self.rows)
+        for holiday in holidays:
+            row = TableRow.from_holiday(holiday)
+            row_id = len(self.rows)
+            self.rows.append(row)
+            for column in SEARCH_COLUMNS:
+                for word in WORD.findall(row.values[COLUMNS.index(column)].casefold()):
+                    self.words.setdefault(word, set()).add(row_id)
+        if len(self.rows) > first:
+            self.orders.clear()
+            self.vocabulary = []
+        return range(first, len(self.rows))
+
+    def clear(self):
+        """ Remove every row. """
+        self.rows.clear()
+        self.orders.clear()
+        self.words.clear()
+        self.vocabulary = []
+
+    def order(self, column: str, reverse: bool = False) -> List[int]:
+        """ Row ids sorted by a column, reusing the ordering until rows change. """
+        if column not in self.orders:
+            keys = [row.sort_key(column) for row in self.rows]
+            self.orders[column] = sorted(range(len(keys)), key=keys.__getitem__)
+        return self.orders[column][::-1] if reverse else self.orders[column]
+
+    def matching(self, query: str) -> Optional[Set[int]]:
+        """ Row ids whose name or description has a word starting with every query word. """
+        terms = WORD.findall(query.casefold())
+        if not terms:
+            return None
+        if not self.vocabulary:
+            self.vocabulary = sorted(self.words)
+        matches: Optional[Set[int]] = None
+        for term in terms:
+            found: Set[int] = set()
+            index = bisect.bisect_left(self.vocabulary, term)
+            while index < len(self.vocabulary) and self.vocabulary[index].startswith(term):
+                found |= self.words[self.vocabulary[index]]
+                index += 1
+            matches = found if matches is None else matches & found
+            if not matches:
+                break
+        return matches
+
+    def view(self, column: Optional[str], reverse: bool, query: str) -> List[int]:
+        """ Row ids to display, sorted by a column (or in load order) and filtered by a query. """
+        ids = self.order(column, reverse) if column else range(len(self.rows))
+        matches = self.matching(query)
+        if matches is None:
+            return list(ids)
+        return [row_id for row_id in ids if row_id in matches]
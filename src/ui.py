@@ -2,16 +2,35 @@
 NorseCalendar UI
 """
 # pylint: disable=too-many-instance-attributes
+# pylint: disable=too-many-public-methods
 # pylint: disable=unused-argument
 # pylint: disable=unused-variable
+import collections
 import datetime
+import itertools
 import logging
+import queue
+import threading
+import time
 import tkinter as tk
+from typing import Optional, Tuple
 from tkinter import ttk, messagebox
-import tkcalendar
+import metrics
 from dev_menu import dev_menu
 from generators import generate_summary, export_summary, generate_ics
-from calculate_dates import get_holidays
+from calculate_dates import get_holidays_range
+from calendar_index import CalendarIndex
+from table_model import TableModel
+
+# Years generated per pass by the Submit worker after the first year
+SUBMIT_CHUNK_YEARS = 25
+# How often, and for how long at most, the UI drains results from the worker
+POLL_INTERVAL_MS = 50
+POLL_BUDGET_SECONDS = 0.05
+# Render another Summary year once the view reaches this fraction of the rendered text
+SUMMARY_RENDER_AHEAD = 0.9
+# Longest the Table View may spend inserting rows before yielding to Tk
+FILL_BUDGET_SECONDS = 0.02
 
 class ToolTip:
     """ Tooltip class for Tkinter widgets. """
@@ -65,15 +84,22 @@ class UI():
         self.summary = tk.Text(tab1, state='disabled')
         yscrollbar = ttk.Scrollbar(tab1, orient="vertical", command=self.summary.yview)
         yscrollbar.pack(side="right", fill="y")
-        self.summary.configure(yscrollcommand=yscrollbar.set)
+        self.summary.configure(yscrollcommand=lambda first, last: self.summary_scrolled(
+            yscrollbar, first, last))
         self.summary.pack(fill="both", expand=True)
+        # Year sections loaded but not yet rendered into the Summary tab
+        self.summary_years: collections.deque = collections.deque()
+        self.summary_job = None
         tab2 = ttk.Frame(tab_control)
         tab_control.add(tab2, text="Table View")
         self.columns = ("Name", "Start", "End", "Description", "Schedule")
+        self.create_search(tab2)
         self.table = ttk.Treeview(tab2, columns=self.columns, show='headings')
+        self.sort_column = None
         self.reverse = False
-        for self.col in self.columns:
-            self.table.heading(self.col, text=self.col, command=self.treeview_sort_columns())
+        for col in self.columns:
+            self.table.heading(col, text=col,
+                               command=lambda _col=col: self.treeview_sort_columns(_col))
 
         self.table.heading("Name", text="Name")
         self.table.column("Name", minwidth=150, width=150, stretch=False)
@@ -93,11 +119,12 @@ class UI():
 
         self.table.configure(xscrollcommand=xscrollbar.set, yscrollcommand=yscrollbar.set)
         self.table.pack(fill="both", expand=True)
+        # Row model behind the Table View, and holidays not yet inserted into the widgets
+        self.table_model = TableModel()
+        self.pending_holidays: collections.deque = collections.deque()
+        self.fill_job = None
 
-        tab3 = ttk.Frame(tab_control)
-        tab_control.add(tab3, text="Calendar")
-        self.calendar_widget = tkcalendar.Calendar(tab3, selectmode='day', state='disabled')
-        self.calendar_widget.pack(fill="both", expand=True)
+        self.create_calendar(tab_control)
         tab_control.pack(expand=1, fill="both")
 
         self.create_bottom()
@@ -106,8 +133,6 @@ class UI():
         #submit_button.bind("<Button-1>", self.submit())
         self.start_year_selector.bind("<<ComboboxSelected>>", self.combo_box_selected())
         self.end_year_selector.bind("<<ComboboxSelected>>", self.combo_box_selected())
-        self.calendar_widget.bind("<<CalendarSelected>>",
-                        lambda event: self.show_calendar_event_details())
 
     def create_top(self):
         """
@@ -137,14 +162,91 @@ class UI():
         year_frame2.pack()
         top_buttons = ttk.Frame(self.window)
         #submit_button = tk.Button(top_buttons,text="Submit")
-        submit_button = tk.Button(top_buttons, text="Submit", command=self.submit)
-        ToolTip(submit_button, "Submit the selected year range.")
+        self.submit_button = tk.Button(top_buttons, text="Submit", command=self.submit)
+        ToolTip(self.submit_button, "Submit the selected year range.")
         #clear_button = tk.Button(top_buttons, text="Clear")
-        clear_button = tk.Button(top_buttons, text="Clear", command=self.clear)
-        ToolTip(clear_button, "Clear all fields.")
+        self.clear_button = tk.Button(top_buttons, text="Clear", command=self.clear)
+        ToolTip(self.clear_button, "Clear all fields.")
+        self.cancel_button = tk.Button(top_buttons, text="Cancel", command=self.cancel,
+                                       state='disabled')
+        ToolTip(self.cancel_button, "Stop loading the remaining years.")
         top_buttons.pack()
-        submit_button.pack(side=tk.LEFT)
-        clear_button.pack()
+        self.submit_button.pack(side=tk.LEFT)
+        self.clear_button.pack(side=tk.LEFT)
+        self.cancel_button.pack()
+        self.progress = ttk.Progressbar(self.window, orient="horizontal", mode="determinate",
+                                        length=300)
+        self.progress.pack(pady=5)
+        self.worker = None
+        self.loading_range = (self.current_year, self.current_year)
+        # Years of the last completed load, which the exports cover
+        self.loaded_range: Optional[Tuple[int, int]] = None
+        self.submit_started = 0.0
+        self.cancel_event = threading.Event()
+        self.results: queue.Queue = queue.Queue()
+
+    def create_calendar(self, tab_control: ttk.Notebook):
+        """
+        Create the Calendar tab; its widget is built the first time the tab is shown
+        
+        :param self: Description
+        :param tab_control: Notebook holding the tabs
+        """
+        self.calendar_tab = ttk.Frame(tab_control)
+        tab_control.add(self.calendar_tab, text="Calendar")
+        self.calendar_widget = None
+        # Set once a range has finished loading
+        self.calendar_ready = False
+        # Events are only created for the displayed month and its neighbours
+        self.calendar_index = CalendarIndex()
+        tab_control.bind("<<NotebookTabChanged>>",
+                         lambda event: self.tab_changed(tab_control))
+
+    def tab_changed(self, tab_control: ttk.Notebook):
+        """
+        Build the Calendar widget when its tab is first selected
+        
+        :param self: Description
+        :param tab_control: Notebook holding the tabs
+        """
+        if self.calendar_widget is None and tab_control.select() == str(self.calendar_tab):
+            self.build_calendar()
+
+    def build_calendar(self):
+        """
+        Import tkcalendar and create the Calendar widget
+        
+        :param self: Description
+        """
+        import tkcalendar # pylint: disable=import-outside-toplevel
+        logging.info("Building Calendar widget")
+        self.calendar_widget = tkcalendar.Calendar(self.calendar_tab, selectmode='day',
+                                                   state='disabled')
+        self.calendar_widget.pack(fill="both", expand=True)
+        self.calendar_widget.tag_config('holiday', background='lightblue', foreground='black')
+        self.calendar_widget.bind("<<CalendarSelected>>",
+                        lambda event: self.show_calendar_event_details())
+        self.calendar_widget.bind("<<CalendarMonthChanged>>",
+                        lambda event: self.refresh_calendar_events())
+        if self.calendar_ready:
+            self.show_calendar_range()
+
+    def create_search(self, tab: ttk.Frame):
+        """
+        Create the Table View search box
+        
+        :param self: Description
+        :param tab: Table View tab
+        """
+        search_frame = ttk.Frame(tab)
+        search_label = tk.Label(search_frame, text="Search:")
+        search_label.pack(side=tk.LEFT)
+        self.search_text = tk.StringVar()
+        self.search_text.trace_add("write", lambda *args: self.apply_table_view())
+        search_entry = ttk.Entry(search_frame, textvariable=self.search_text, width=40)
+        ToolTip(search_entry, "Show only holidays whose name or description contains these words.")
+        search_entry.pack(side=tk.LEFT)
+        search_frame.pack(fill="x")
 
     def create_bottom(self):
         """
@@ -154,12 +256,11 @@ class UI():
         """
         bottom_buttons = ttk.Frame(self.window)
         self.generate_ics_button = tk.Button(bottom_buttons, text="Generate ICS",
-                                    command=lambda: generate_ics(self.start_year_selector,
-                                                                self.end_year_selector))
+                                    command=lambda: generate_ics(*self.loaded_range))
         ToolTip(self.generate_ics_button, "Generate an ICS file for calendar import.")
         self.generate_ics_button.config(state='disabled')
         self.generate_printable_button = tk.Button(bottom_buttons, text="Export Summary",
-                                    command=lambda: export_summary(self.summary))
+                                    command=lambda: export_summary(*self.loaded_range))
         ToolTip(self.generate_printable_button, "Export a printable summary file.")
         self.generate_printable_button.config(state='disabled')
         bottom_buttons.pack()
@@ -186,56 +287,25 @@ class UI():
             logging.info("Start Year: %d, End Year: %d",
                             int(self.start_year_selector.get()),
                             int(self.end_year_selector.get()))
-            if int(self.end_year_selector.get()) == int(self.start_year_selector.get()):
-                years = [int(self.start_year_selector.get())]
-            else:
-                years = list(range(int(self.start_year_selector.get()),
-                                   int(self.end_year_selector.get())+1))
-            for year in years:
-                logging.info("Requesting Year: %s", year)
-                self.summary.config(state='normal')
-                holidays = get_holidays(year)
-                if holidays is None:
-                    logging.error("No holidays calculated for year %d.", year)
-                    self.summary.insert(1.0,
-                                    f"No holidays calculated for {year}. See log for details.\n")
-                else:
-                    self.summary.insert(1.0, generate_summary(holidays))
-                    self.summary.config(state='disabled')
-                    for holiday in holidays:
-                        clean_end_date = holiday.end_date if holiday.end_date else ""
-                        clean_description = holiday.description if holiday.description else ""
-                        clean_schedule = holiday.schedule if holiday.schedule else ""
-
-                        self.table.insert("",
-                                    tk.END,
-                                    text=holiday.name,
-                                    values=(holiday.name,
-                                            holiday.start_date,
-                                            clean_end_date,
-                                            clean_description,
-                                            clean_schedule))
-                        event_details = (
-                            f"{holiday.name}\n"
-                            f"Description: {holiday.description}\n"
-                            f"Schedule: {holiday.schedule}"
-                        )
-
-                        start_date = datetime.datetime.strptime(str(holiday.start_date), '%Y-%m-%d')
-                        self.calendar_widget.calevent_create(start_date, event_details, 'holiday')
-            self.calendar_widget.tag_config('holiday', background='lightblue', foreground='black')
-            self.calendar_widget.config(state='normal',
-                                    mindate=datetime.date((int(self.start_year_selector.get())-1),
-                                                            12,
-                                                            31),
-                                    maxdate=datetime.date((int(self.end_year_selector.get())+1),
-                                                          1,
-                                                          1))
-            self.calendar_widget.selection_set(datetime.date(self.current_year,
-                                                        datetime.date.today().month,
-                                                        datetime.date.today().day))
-            self.generate_ics_button.config(state='normal')
-            self.generate_printable_button.config(state='normal')
+            start_year = int(self.start_year_selector.get())
+            end_year = max(start_year, int(self.end_year_selector.get()))
+            self.submit_button.config(state='disabled')
+            self.clear_button.config(state='disabled')
+            # Exports cover the loaded range, which changes once this load finishes
+            self.generate_ics_button.config(state='disabled')
+            self.generate_printable_button.config(state='disabled')
+            self.cancel_button.config(state='normal')
+            self.loading_range = (start_year, end_year)
+            self.submit_started = time.perf_counter()
+            self.progress.config(maximum=end_year - start_year + 1, value=0)
+            self.cancel_event = threading.Event()
+            self.results = queue.Queue()
+            self.worker = threading.Thread(target=self.load_years,
+                                           args=(start_year, end_year,
+                                                 self.cancel_event, self.results),
+                                           daemon=True)
+            self.worker.start()
+            self.window.after(POLL_INTERVAL_MS, self.poll_results)
         except ValueError:
             messagebox.showerror("Invalid Input", "Year must be between 1700 and 2100.")
             self.start_year_selector.delete(0, tk.END)
@@ -243,6 +313,190 @@ class UI():
         return "break"
 
 
+    @staticmethod
+    def load_years(start_year: int, end_year: int, cancel_event: threading.Event,
+                   results: queue.Queue):
+        """
+        Worker thread: generate holidays and queue them one year at a time
+
+        :param start_year: First year to load
+        :param end_year: Last year to load
+        :param cancel_event: Set by the UI to stop after the current year
+        :param results: Queue of ('year', (year, holidays)), ('error', message) and ('done', None)
+        """
+        try:
+            # The first year on its own so it shows at once, then the rest in larger passes
+            chunk_start = start_year
+            chunk_end = start_year
+            while chunk_start <= end_year and not cancel_event.is_set():
+                holidays_by_year = itertools.groupby(get_holidays_range(chunk_start, chunk_end),
+                                                     key=lambda holiday: holiday.start_date[:4])
+                for year, holidays in holidays_by_year:
+                    if cancel_event.is_set():
+                        break
+                    results.put(('year', (int(year), tuple(holidays))))
+                chunk_start = chunk_end + 1
+                chunk_end = min(end_year, chunk_start + SUBMIT_CHUNK_YEARS - 1)
+        except Exception as e: # pylint: disable=broad-exception-caught
+            logging.exception("Loading holidays failed")
+            results.put(('error', str(e)))
+        results.put(('done', None))
+
+    def poll_results(self):
+        """
+        Display years queued by the worker on the main thread, a time slice at a time
+        
+        :param self: Description
+        """
+        deadline = time.monotonic() + POLL_BUDGET_SECONDS
+        while time.monotonic() < deadline:
+            try:
+                kind, value = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'year':
+                self.display_year(*value)
+            elif kind == 'error':
+                messagebox.showerror("Error", f"Failed to load holidays: {value}")
+            else:
+                self.finish_submit()
+                return
+        self.window.after(POLL_INTERVAL_MS, self.poll_results)
+
+    @metrics.timed("ui.display_year")
+    def display_year(self, year: int, holidays: tuple):
+        """
+        Add one year of holidays to the Summary, Table View and Calendar
+        
+        :param self: Description
+        :param year: Year the holidays start in
+        :param holidays: Holidays starting in that year
+        """
+        logging.info("Displaying Year: %s", year)
+        self.summary_years.append(holidays)
+        self.render_summary()
+        self.calendar_index.add(holidays)
+        if (self.calendar_widget is not None
+                and abs(year - self.calendar_widget.get_displayed_month()[1]) <= 1):
+            self.refresh_calendar_events()
+        self.pending_holidays.extend(holidays)
+        if self.fill_job is None:
+            self.fill_job = self.window.after_idle(self.fill_widgets)
+        self.progress.config(value=year - self.loading_range[0] + 1)
+
+    def summary_scrolled(self, scrollbar: ttk.Scrollbar, first: str, last: str):
+        """
+        Update the Summary scrollbar and render more years when nearing the end
+        
+        :param self: Description
+        :param scrollbar: Summary scrollbar
+        :param first: Top of the visible text, as a fraction
+        :param last: Bottom of the visible text, as a fraction
+        """
+        scrollbar.set(first, last)
+        if float(last) >= SUMMARY_RENDER_AHEAD and self.summary_years and self.summary_job is None:
+            self.summary_job = self.window.after_idle(self.render_summary)
+
+    @metrics.timed("ui.render_summary")
+    def render_summary(self):
+        """
+        Render the next year section into the Summary tab if its end is in view
+        
+        :param self: Description
+        """
+        self.summary_job = None
+        if not self.summary_years or self.summary.yview()[1] < SUMMARY_RENDER_AHEAD:
+            return
+        self.summary.config(state='normal')
+        self.summary.insert(tk.END, generate_summary(self.summary_years.popleft()))
+        self.summary.config(state='disabled')
+
+    @metrics.timed("ui.fill_widgets")
+    def fill_widgets(self):
+        """
+        Insert pending holidays into the Table View in timed batches
+        
+        :param self: Description
+        """
+        deadline = time.monotonic() + FILL_BUDGET_SECONDS
+        while self.pending_holidays and time.monotonic() < deadline:
+            holiday = self.pending_holidays.popleft()
+            for row_id in self.table_model.extend((holiday,)):
+                self.table.insert("", tk.END, iid=str(row_id), text=holiday.name,
+                                  values=self.table_model.rows[row_id].values)
+        # Yield to the event loop between batches
+        if self.pending_holidays:
+            self.fill_job = self.window.after(1, self.fill_widgets)
+            return
+        self.fill_job = None
+        if self.sort_column is not None or self.search_text.get():
+            self.apply_table_view()
+
+    @metrics.timed("ui.refresh_calendar_events")
+    def refresh_calendar_events(self):
+        """
+        Recreate Calendar events for the displayed month and its neighbours
+        
+        :param self: Description
+        """
+        month, year = self.calendar_widget.get_displayed_month()
+        self.calendar_widget.calevent_remove('all')
+        for day in self.calendar_index.days_around(year, month):
+            event_details = "\n".join(holiday.name for holiday in self.calendar_index.on(day))
+            self.calendar_widget.calevent_create(day, event_details, 'holiday')
+
+    def finish_submit(self):
+        """
+        Re-enable the UI once the worker has stopped
+        
+        :param self: Description
+        """
+        self.worker = None
+        self.submit_button.config(state='normal')
+        self.clear_button.config(state='normal')
+        self.cancel_button.config(state='disabled')
+        if self.cancel_event.is_set():
+            logging.info("Holiday loading cancelled")
+            if self.loaded_range is not None:
+                self.generate_ics_button.config(state='normal')
+                self.generate_printable_button.config(state='normal')
+            return
+        if metrics.ENABLED:
+            # From the Submit click until the last year is displayed
+            metrics.observe("ui.submit", time.perf_counter() - self.submit_started)
+        self.progress.config(value=self.progress.cget('maximum'))
+        self.calendar_ready = True
+        if self.calendar_widget is not None:
+            self.show_calendar_range()
+        self.loaded_range = self.loading_range
+        self.generate_ics_button.config(state='normal')
+        self.generate_printable_button.config(state='normal')
+
+    def show_calendar_range(self):
+        """
+        Enable the Calendar for the loaded range and show today's month
+        
+        :param self: Description
+        """
+        self.calendar_widget.config(state='normal',
+                                mindate=datetime.date(self.loading_range[0] - 1, 12, 31),
+                                maxdate=datetime.date(self.loading_range[1] + 1, 1, 1))
+        self.calendar_widget.selection_set(datetime.date(self.current_year,
+                                                    datetime.date.today().month,
+                                                    datetime.date.today().day))
+        self.refresh_calendar_events()
+
+    def cancel(self):
+        """
+        Handle Cancel Button Press
+        
+        :param self: Description
+        """
+        logging.info("Cancelling holiday loading")
+        self.cancel_event.set()
+        self.cancel_button.config(state='disabled')
+        return "break"
+
     def clear(self):
         """
         Handle Clear Button Press
@@ -250,17 +504,35 @@ class UI():
         :param self: Description
         """
         logging.info("Clearing GUI")
+        if self.summary_job is not None:
+            self.window.after_cancel(self.summary_job)
+            self.summary_job = None
+        self.summary_years.clear()
         self.summary.config(state='normal')
         self.summary.delete(1.0, tk.END)
         self.summary.config(state='disabled')
-        self.table.delete(*self.table.get_children())
+        if self.fill_job is not None:
+            self.window.after_cancel(self.fill_job)
+            self.fill_job = None
+        self.pending_holidays.clear()
+        # Rows hidden by the search are detached, so get_children() would miss them
+        self.table.delete(*(str(row_id) for row_id in range(len(self.table_model))))
+        self.table_model.clear()
+        self.sort_column = None
+        self.reverse = False
+        self.search_text.set("")
+        self.progress.config(value=0)
         self.start_year_selector.set(str(datetime.datetime.now().year))
         self.end_year_selector.set(str(datetime.datetime.now().year))
+        self.loaded_range = None
         self.generate_ics_button.config(state='disabled')
         self.generate_printable_button.config(state='disabled')
-        self.calendar_widget.calevent_remove('all')
-        self.calendar_widget.selection_set(datetime.date.today())
-        self.calendar_widget.config(state='disabled')
+        self.calendar_index.clear()
+        self.calendar_ready = False
+        if self.calendar_widget is not None:
+            self.calendar_widget.calevent_remove('all')
+            self.calendar_widget.selection_set(datetime.date.today())
+            self.calendar_widget.config(state='disabled')
         return "break"
 
     def combo_box_selected(self):
@@ -276,31 +548,30 @@ class UI():
         if end_year < start_year:
             self.end_year_selector.set(start_year)
 
-    def treeview_sort_columns(self):
+    def treeview_sort_columns(self, col: str):
         """
-        Sort Treeview columns on click
+        Sort Treeview columns on click, reversing on repeated clicks
         
         :param self: Description
+        :param col: Column to sort by
         """
-        l = [(self.table.set(k, self.col), k) for k in self.table.get_children('')]
-        logging.info("Sorting column: %s, Reverse: %s", self.col, self.reverse)
-        if self.col in ["Start", "End"]:
-            l.sort(key=lambda t:
-                datetime.datetime.strptime(t[0],
-                                            '%m-%d-%Y') if t[0] else datetime.datetime.max,
-                reverse=self.reverse)
-        else:
-            l.sort(reverse=self.reverse)
-
-        # rearrange items in sorted positions
-        for index, (val, k) in enumerate(l):
-            self.table.move(k, '', index)
-
-        # reverse sort next time
-        self.table.heading(self.col, text=self.col, command=lambda _col=self.col: \
-                    self.treeview_sort_columns())
+        self.reverse = not self.reverse if col == self.sort_column else False
+        self.sort_column = col
+        logging.info("Sorting column: %s, Reverse: %s", col, self.reverse)
+        self.apply_table_view()
         return "break"
 
+    @metrics.timed("ui.apply_table_view")
+    def apply_table_view(self):
+        """
+        Show the model's rows in the current sort order, filtered by the search box
+        
+        :param self: Description
+        """
+        row_ids = self.table_model.view(self.sort_column, self.reverse, self.search_text.get())
+        # Reorder and detach rows in a single call
+        self.table.set_children("", *(str(row_id) for row_id in row_ids))
+
     def show_calendar_event_details(self):
         """
         Handle event details display on date click
@@ -310,9 +581,13 @@ class UI():
         selected_date = self.calendar_widget.selection_get()
         if selected_date is not None:
             logging.info("Displaying details for date: %s", selected_date.strftime('%m-%d-%Y'))
-            event_ids = self.calendar_widget.get_calevents(selected_date)
-            for event_id in event_ids:
-                event_text = self.calendar_widget.calevent_cget(event_id, option="text")
+            # Served from the date index, which includes every day of multi-day holidays
+            for holiday in self.calendar_index.on(selected_date):
+                event_text = (
+                    f"{holiday.name}\n"
+                    f"Description: {holiday.description}\n"
+                    f"Schedule: {holiday.schedule}"
+                )
                 date = selected_date.strftime('%m-%d-%Y')
                 messagebox.showinfo("Event Details",
                                     f"Event: {event_text}\nDate: {date}")
@@ -0,0 +1,101 @@
+""" Local stand-in for the USNO seasons and moon phases API, serving recorded fixtures. """
+import datetime
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterable, Optional
+from urllib.parse import parse_qs, urlsplit
+import calculate_dates
+from data_sources import (USNO_MAX_PHASES, DataSource, LocalSource, ReplaySource, USNOSource,
+                          fixture_path, moon_phases_key, seasons_key)
+from http_cache import ResponseCache
+from http_client import shared_client
+
+def record(directory: str, years: Iterable[int], upstream: DataSource) -> None:
+    """ Record the seasons and moon phases requests made for years not yet recorded. """
+    recorder = ReplaySource(directory, upstream)
+    for year in years:
+        # Read at call time, so the current settings are recorded
+        recorder.seasons(year, calculate_dates.TIMEZONE, calculate_dates.DST)
+        recorder.moon_phases(datetime.date(year, 1, 1), USNO_MAX_PHASES)
+
+def generate_fixtures(directory: str, years: Iterable[int]) -> None:
+    """ Write USNO-shaped fixtures from the built-in engine for years not yet recorded. """
+    record(directory, years, LocalSource())
+
+def record_fixtures(directory: str, years: Iterable[int],
+                    base: str = "https://aa.usno.navy.mil/api") -> None:
+    """ Record fixtures from the live USNO API. """
+    # Recordings are the cache here, so keep responses out of the on-disk HTTP cache
+    responses = ResponseCache(shared_client(), path=":memory:")
+    record(directory, years, USNOSource(lambda: responses, base))
+    logging.info("Recorded USNO fixtures for years %s", years)
+
+class StubServer():
+    """ Serve fixtures on the USNO URL paths from a background thread, with added latency. """
+    def __init__(self, directory: str, latency: float = 0.0, host: str = "127.0.0.1"):
+        self.directory = directory
+        self.latency = latency
+        self.requests = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """ Map USNO requests to fixture files. """
+            def do_GET(self): # pylint: disable=invalid-name
+                """ Answer one API request from its fixture. """
+                with stub.lock:
+                    stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                path = stub.fixture_for(self.path)
+                if path is None or not os.path.exists(path):
+                    self.send_error(404, "No fixture recorded")
+                    return
+                with open(path, 'rb') as fixture:
+                    body = fixture.read()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args): # pylint: disable=redefined-builtin
+                """ Keep request logs out of benchmark output. """
+
+        self.server = ThreadingHTTPServer((host, 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        """ Replacement for the USNO API base URL. """
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/api"
+
+    def fixture_for(self, target: str) -> Optional[str]:
+        """ Fixture file answering a request target, if the endpoint is known. """
+        url = urlsplit(target)
+        params = parse_qs(url.query)
+        try:
+            if url.path == "/api/seasons":
+                key = seasons_key(int(params["year"][0]), int(params["tz"][0]),
+                                  params["dst"][0] == "true")
+                return fixture_path(self.directory, "seasons", key)
+            if url.path == "/api/moon/phases/date":
+                key = moon_phases_key(datetime.date.fromisoformat(params["date"][0]),
+                                      int(params["nump"][0]))
+                return fixture_path(self.directory, "moon", key)
+        except (KeyError, ValueError):
+            return None
+        return None
+
+    def __enter__(self) -> "StubServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
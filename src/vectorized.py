@@ -0,0 +1,148 @@
+""" NumPy backend evaluating holiday rules for many years at once.
+
+The application never uses it: NumPy is an optional dependency, installed in CI where
+verify_engine checks this backend against the scalar rule graph. """
+import datetime
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from holiday_rules import NORSE_CALENDAR, DateSpec, RuleGraph
+from calculate_dates import (Holiday, MoonIndex, get_core_dates, get_moon_timeline,
+                             season_inputs)
+
+# Instants are int64 seconds since 1970-01-01, a Thursday
+EPOCH = datetime.datetime(1970, 1, 1)
+DAY = 86400
+EPOCH_WEEKDAY = 3
+NO_END = np.iinfo(np.int64).min
+
+@dataclass
+class HolidayColumns():
+    """ Holiday occurrences as parallel arrays, one row per occurrence, grouped by year. """
+    year: np.ndarray
+    rule: np.ndarray
+    start: np.ndarray
+    end: np.ndarray
+    names: Tuple[str, ...]
+
+def to_seconds(dates: List[datetime.datetime]) -> np.ndarray:
+    """ Convert datetimes to int64 seconds since the epoch. """
+    return np.array([(date - EPOCH) // datetime.timedelta(seconds=1) for date in dates],
+                    dtype=np.int64)
+
+def from_seconds(seconds: int) -> datetime.datetime:
+    """ Convert seconds since the epoch to a datetime. """
+    return EPOCH + datetime.timedelta(seconds=int(seconds))
+
+def fixed_dates(years: np.ndarray, month: int, day: int) -> np.ndarray:
+    """ Seconds since the epoch of a month/day in each year. """
+    months = (years - 1970).astype('datetime64[Y]').astype('datetime64[M]') + (month - 1)
+    days = months.astype('datetime64[D]') + (day - 1)
+    return days.astype(np.int64) * DAY
+
+def _after(dates: np.ndarray, instants: np.ndarray) -> np.ndarray:
+    """ First date strictly after each instant. """
+    index = np.searchsorted(dates, instants, side='right')
+    if np.any(index == len(dates)):
+        raise ValueError("No moon phase data after the requested dates")
+    return dates[index]
+
+def _before(dates: np.ndarray, instants: np.ndarray) -> np.ndarray:
+    """ Last date strictly before each instant. """
+    index = np.searchsorted(dates, instants, side='left') - 1
+    if np.any(index < 0):
+        raise ValueError("No moon phase data before the requested dates")
+    return dates[index]
+
+def moon_step(step: str, instants: np.ndarray, new_moons: np.ndarray,
+              full_moons: np.ndarray) -> np.ndarray:
+    """ Apply one MoonIndex query to every instant. """
+    if step == "next_new_moon":
+        return _after(new_moons, instants)
+    if step == "next_full_moon":
+        return _after(full_moons, instants)
+    if step == "previous_full_moon":
+        return _before(full_moons, instants)
+    previous = _before(full_moons, instants)
+    following = _after(full_moons, instants)
+    return np.where(instants - previous < following - instants, previous, following)
+
+def resolve(spec: DateSpec, years: np.ndarray, values: Dict[str, np.ndarray],
+            new_moons: np.ndarray, full_moons: np.ndarray) -> np.ndarray:
+    """ Evaluate a DateSpec for every year, mirroring DateSpec.resolve. """
+    if spec.month_day is not None:
+        return fixed_dates(years, *spec.month_day)
+    instants = values[spec.anchor]
+    if spec.midpoint is not None:
+        instants = instants + (values[spec.midpoint] - instants) // 2
+    for step in spec.moons:
+        instants = moon_step(step, instants, new_moons, full_moons)
+    if spec.weekday is not None:
+        weekdays = (instants // DAY + EPOCH_WEEKDAY) % 7
+        instants = instants - ((weekdays - spec.weekday) % 7) * DAY
+    return instants + spec.days * DAY
+
+def evaluate_columns(rules: RuleGraph, years: np.ndarray, inputs: Dict[str, np.ndarray],
+                     new_moons: np.ndarray, full_moons: np.ndarray) -> HolidayColumns:
+    """ Evaluate every rule for every year in one pass over the input arrays. """
+    values = dict(inputs)
+    evaluated = {}
+    for name in rules.order:
+        rule = rules.rules[name]
+        start = resolve(rule.start, years, values, new_moons, full_moons)
+        end = (resolve(rule.end, years, values, new_moons, full_moons) if rule.end
+               else np.full_like(start, NO_END))
+        values[name] = start
+        evaluated[name] = [(start + rule.step_days * each * DAY, end)
+                           for each in range(rule.repeat)]
+
+    names = tuple(rules.rules)
+    rows = [(index, start, end)
+            for index, name in enumerate(names)
+            for start, end in evaluated[name]]
+    per_year = len(rows)
+    return HolidayColumns(
+        year=np.repeat(years, per_year),
+        rule=np.tile(np.array([row[0] for row in rows], dtype=np.int64), len(years)),
+        start=np.stack([row[1] for row in rows], axis=1).ravel(),
+        end=np.stack([row[2] for row in rows], axis=1).ravel(),
+        names=names)
+
+def columns_to_holidays(rules: RuleGraph, columns: HolidayColumns) -> Dict[int, List[Holiday]]:
+    """ Build Holiday objects per year, sorted by start date like the scalar path. """
+    order = np.lexsort((columns.start, columns.year))
+    all_rules = [rules.rules[name] for name in columns.names]
+    holidays: Dict[int, List[Holiday]] = {int(year): [] for year in np.unique(columns.year)}
+    for year, rule_index, start, end in zip(columns.year[order].tolist(),
+                                            columns.rule[order].tolist(),
+                                            columns.start[order].tolist(),
+                                            columns.end[order].tolist()):
+        rule = all_rules[rule_index]
+        holidays[year].append(Holiday(rule.name,
+                                      from_seconds(start),
+                                      None if end == NO_END else from_seconds(end),
+                                      rule.description,
+                                      rule.schedule))
+    return holidays
+
+def calculate_dates_range_vectorized(start: int, end: int, use_api: Optional[bool] = None,
+                                     rules: RuleGraph = NORSE_CALENDAR
+                                     ) -> Dict[int, List[Holiday] | None]:
+    """ Vectorized equivalent of calculate_dates.calculate_dates_range. """
+    logging.info("Calculating holidays for years %d-%d (vectorized)", start, end)
+    all_phenoms = {year: get_core_dates(year, use_api) for year in range(start - 1, end + 1)}
+    moons = MoonIndex(get_moon_timeline(start, end, use_api))
+    years = [year for year in range(start, end + 1)
+             if len(all_phenoms[year]['data']) >= 6 and len(all_phenoms[year - 1]['data']) >= 6]
+    for year in sorted(set(range(start, end + 1)) - set(years)):
+        logging.error("Insufficient data from phenom API for year %d.", year)
+    results: Dict[int, List[Holiday] | None] = {year: None for year in range(start, end + 1)}
+    if not years:
+        return results
+    year_inputs = [season_inputs(all_phenoms[year], all_phenoms[year - 1]) for year in years]
+    inputs = {name: to_seconds([each[name] for each in year_inputs]) for name in rules.inputs}
+    columns = evaluate_columns(rules, np.array(years, dtype=np.int64), inputs,
+                               to_seconds(moons.new_moons), to_seconds(moons.full_moons))
+    results.update(columns_to_holidays(rules, columns))
+    return results
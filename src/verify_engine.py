@@ -0,0 +1,167 @@
+""" Check the built-in engine against reference data: python -m verify_engine [--fixtures DIR...]
+
+Every seasons_*.json and moon_*.json fixture in the directories is recomputed with the engine:
+fixtures/usno holds USNO responses, and fixtures/reference PyEphem results spread across
+1701-2100, written by reference_fixtures. Equinox, solstice and moon phase dates must match
+exactly and their times within TOLERANCE_MINUTES. Apsides are not checked: holidays never use
+them, and the engine places them for the Earth-Moon barycentre, hours away from USNO's
+Earth-centred times.
+
+The NumPy rule evaluation (vectorized.py) is also checked against the scalar rule graph for
+every year of TABLE_YEARS, and the shipped holiday table (holidays.bin) against the holidays
+the engine calculates now, so a table left stale by a rule, setting or engine change fails.
+"""
+import argparse
+import datetime
+import glob
+import json
+import logging
+import os
+import re
+import sys
+from typing import Dict, List, Optional
+from calculate_dates import (TABLE_YEARS, Holiday, calculate_dates_range, fingerprint,
+                             holiday_rows)
+from data_sources import LocalSource
+from holiday_table import TABLE_PATH, HolidayTable
+from usno_stub import record_fixtures
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "usno")
+REFERENCE_FIXTURES = os.path.join(os.path.dirname(FIXTURES), "reference")
+TOLERANCE_MINUTES = 2
+CHECKED_PHENOMS = ("Equinox", "Solstice")
+
+SEASONS_FIXTURE = re.compile(r"seasons_(-?\d+)_tz(-?\d+)_dst([01])\.json$")
+MOON_FIXTURE = re.compile(r"moon_(\d{4}-\d{2}-\d{2})_n(\d+)\.json$")
+
+def instant(entry: dict) -> datetime.datetime:
+    """ Date and time of a USNO seasons or moon phase entry. """
+    hour, minute = (int(part) for part in entry["time"].split(":"))
+    return datetime.datetime(entry["year"], entry["month"], entry["day"], hour, minute)
+
+def compare(label: str, expected: dict, computed: dict) -> List[str]:
+    """ Mismatches between a USNO entry and the engine's, if any. """
+    if (expected["year"], expected["month"], expected["day"]) != \
+            (computed["year"], computed["month"], computed["day"]):
+        return [f"{label}: fixture {instant(expected)}, engine {instant(computed)}"]
+    minutes = abs((instant(expected) - instant(computed)).total_seconds()) / 60
+    if minutes > TOLERANCE_MINUTES:
+        return [f"{label}: fixture {expected['time']}, engine {computed['time']} "
+                f"({minutes:.0f} min apart)"]
+    return []
+
+def check_seasons(name: str, expected: dict, computed: dict) -> List[str]:
+    """ Mismatches between a USNO seasons response and the engine's. """
+    # Reference fixtures have no apsides, so only the checked entries are paired
+    usno_entries = [entry for entry in expected["data"] if entry["phenom"] in CHECKED_PHENOMS]
+    local_entries = [entry for entry in computed["data"] if entry["phenom"] in CHECKED_PHENOMS]
+    if len(usno_entries) != len(local_entries):
+        return [f"{name}: fixture {len(usno_entries)} equinoxes and solstices, "
+                f"engine {len(local_entries)}"]
+    problems = []
+    for usno, local in zip(usno_entries, local_entries):
+        if usno["phenom"] != local["phenom"]:
+            problems.append(f"{name}: fixture {usno['phenom']}, engine {local['phenom']}")
+        else:
+            problems.extend(compare(f"{name} {usno['phenom']}", usno, local))
+    return problems
+
+def check_moon_phases(name: str, expected: dict, computed: dict) -> List[str]:
+    """ Mismatches between a USNO moon phases response and the engine's. """
+    problems = []
+    for usno, local in zip(expected["phasedata"], computed["phasedata"]):
+        if usno["phase"] != local["phase"]:
+            problems.append(f"{name}: fixture {usno['phase']} on {instant(usno)}, "
+                            f"engine {local['phase']} on {instant(local)}")
+        else:
+            problems.extend(compare(f"{name} {usno['phase']}", usno, local))
+    return problems
+
+def check_fixture(path: str, engine: LocalSource) -> List[str]:
+    """ Recompute one fixture with the engine, returning every mismatch. """
+    with open(path, encoding="utf-8") as fixture:
+        expected = json.load(fixture)
+    # e.g. usno/seasons_2025_tz0_dst0.json
+    name = os.path.join(os.path.basename(os.path.dirname(path)), os.path.basename(path))
+    seasons = SEASONS_FIXTURE.search(name)
+    if seasons:
+        computed = engine.seasons(int(seasons[1]), int(seasons[2]), seasons[3] == "1")
+        return check_seasons(name, expected, computed)
+    moon = MOON_FIXTURE.search(name)
+    if moon:
+        computed = engine.moon_phases(datetime.date.fromisoformat(moon[1]), int(moon[2]))
+        return check_moon_phases(name, expected, computed)
+    return [f"{name}: not a seasons or moon phases fixture"]
+
+def check_vectorized(scalar: Dict[int, Optional[List[Holiday]]]) -> List[str]:
+    """ Years whose vectorized holidays differ from the scalar path's. """
+    try:
+        # NumPy is optional, only needed for this check
+        from vectorized import ( # pylint: disable=import-outside-toplevel
+            calculate_dates_range_vectorized)
+    except ImportError as numpy_error:
+        return [f"Vectorized holidays not checked: {numpy_error} (pip install numpy)"]
+    start, end = min(scalar), max(scalar)
+    vectorized = calculate_dates_range_vectorized(start, end, use_api=False)
+    return [f"Vectorized holidays for {year} differ from the scalar path"
+            for year in range(start, end + 1) if scalar[year] != vectorized[year]]
+
+def check_table(scalar: Dict[int, Optional[List[Holiday]]], path: str = TABLE_PATH) -> List[str]:
+    """ Problems with the shipped holiday table: other rules or settings, or years whose
+    holidays differ from the engine's. """
+    try:
+        table = HolidayTable(path)
+    except (OSError, ValueError) as table_error:
+        return [f"Holiday table unavailable: {table_error}"]
+    problems = []
+    if not table.matches(fingerprint()):
+        problems.append("Holiday table was built with other rules or settings; "
+                        "rebuild it with python -m build_holiday_table")
+    # The table groups holidays by the year they start in
+    expected: Dict[int, list] = {year: [] for year in scalar}
+    for holidays in scalar.values():
+        for row in holiday_rows(holidays or []):
+            year = int(row[1][:4])
+            if year in expected:
+                expected[year].append(row)
+    problems.extend(f"Holiday table differs from the engine for {year}"
+                    for year, rows in expected.items()
+                    if table.covers(year) and table.rows(year) != rows)
+    return problems
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """ Check every fixture, returning 1 if the engine disagrees with any. """
+    parser = argparse.ArgumentParser(prog="python -m verify_engine",
+                                     description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--fixtures", nargs="+", default=[FIXTURES, REFERENCE_FIXTURES],
+                        metavar="DIR", help="fixture directories")
+    parser.add_argument("--record", type=int, nargs="+", metavar="YEAR",
+                        help="first record these years from the live USNO API "
+                             "into the first directory")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    if args.record:
+        record_fixtures(args.fixtures[0], args.record)
+    paths = sorted(path for directory in args.fixtures
+                   for path in glob.glob(os.path.join(directory, "*.json")))
+    if not paths:
+        print(f"No fixtures in {', '.join(args.fixtures)}")
+        return 1
+    engine = LocalSource()
+    problems = [problem for path in paths for problem in check_fixture(path, engine)]
+    print(f"{len(paths)} fixtures checked, {len(problems)} mismatches "
+          f"(tolerance {TOLERANCE_MINUTES} min)")
+    scalar = calculate_dates_range(*TABLE_YEARS, use_api=False)
+    differences = check_vectorized(scalar)
+    print(f"Vectorized and scalar holidays compared for {TABLE_YEARS[0]}-{TABLE_YEARS[1]}, "
+          f"{len(differences)} years differ")
+    problems.extend(differences)
+    table_problems = check_table(scalar)
+    print(f"Holiday table checked against the engine, {len(table_problems)} problems")
+    problems.extend(table_problems)
+    for problem in problems:
+        print(problem)
+    return 1 if problems else 0
+
+if __name__ == '__main__':
+    sys.exit(main())